@@ -0,0 +1,359 @@
+
+"""
+Throughput benchmarks of :meth:`~rwa.hdf5.HDF5Store.poke` and :meth:`~rwa.hdf5.HDF5Store.peek`.
+
+Each workload is written to a temporary file and read back, and reports the best
+write and read times over several repeats, records (HDF5 groups, datasets and attributes)
+per second, megabytes per second, file size and peak Python memory.
+
+Usage::
+
+    python -m rwa.bench [--scale S] [--repeat N] [--only NAME ...] [--import-time] \\
+        [--save baseline.json] [--compare baseline.json] [--tolerance 0.25]
+
+With ``--import-time``, the import time of :mod:`rwa` is measured as well.
+
+With ``--compare``, the workloads which write or read time exceeds that of the baseline
+by more than the tolerance are flagged, and the exit status is 1.
+Timings depend on the machine; baselines should be compared on the same machine only.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+import tempfile
+import argparse
+from collections import OrderedDict
+try:
+    import tracemalloc
+except ImportError: # Py2
+    tracemalloc = None
+
+import numpy as np
+import h5py
+from .hdf5 import HDF5Store
+
+
+class BenchRecord(object):
+    """Auto-serialized type of the *objects* workload."""
+    __slots__ = ('name', 'value', 'weights')
+    def __init__(self, name=None, value=None, weights=None):
+        self.name = name
+        self.value = value
+        self.weights = weights
+
+
+def large_arrays(scale):
+    n = max(1, int(4e6 * scale))
+    return dict(a=np.random.rand(n), b=np.arange(n, dtype=np.int32))
+
+def small_scalars(scale):
+    n = max(1, int(2e3 * scale))
+    return { 'x{:d}'.format(i): (i if i % 3 else float(i)) for i in range(n) }
+
+def nested_dicts(scale):
+    depth, width = 6, max(1, int(4 * scale ** (1. / 6)))
+    def tree(level):
+        if level == depth:
+            return level
+        return { 'k{:d}'.format(i): tree(level + 1) for i in range(width) }
+    return tree(0)
+
+def heterogeneous_list(scale):
+    n = max(1, int(1e3 * scale))
+    # new containers for each element, so that none is written as a link to another
+    def element(i):
+        return (i, 'a', .5, None, (i, 2), np.zeros(3) + i)[i % 6]
+    return [ element(i) for i in range(n) ]
+
+def dataframes(scale):
+    from pandas import DataFrame
+    n, m = max(1, int(1e5 * scale)), 50
+    frame = DataFrame(np.random.rand(n, m), columns=[ 'c{:d}'.format(j) for j in range(m) ])
+    frame['count'] = np.arange(n)
+    return frame
+
+def sparse_matrices(scale):
+    from scipy import sparse
+    n = max(10, int(1e4 * scale))
+    return dict(csr=sparse.random(n, n, density=1e-3, format='csr'),
+        coo=sparse.random(n, n, density=1e-3, format='coo'))
+
+def objects(scale):
+    n = max(1, int(500 * scale))
+    return [ BenchRecord('r{:d}'.format(i), float(i), np.ones(4)) for i in range(n) ]
+
+
+workloads = OrderedDict((
+    ('large_arrays',        large_arrays),
+    ('small_scalars',       small_scalars),
+    ('nested_dicts',        nested_dicts),
+    ('heterogeneous_list',  heterogeneous_list),
+    ('dataframes',          dataframes),
+    ('sparse_matrices',     sparse_matrices),
+    ('objects',             objects),
+    ))
+"""Workload name → function of the scale factor that makes the object to serialize."""
+
+
+def count_records(path):
+    """Number of groups, datasets and attributes in an HDF5 file."""
+    counts = [0]
+    def visit(name, obj):
+        counts[0] += 1 + len(obj.attrs)
+    with h5py.File(path, 'r') as f:
+        counts[0] += len(f.attrs)
+        f.visititems(visit)
+    return counts[0]
+
+def write(path, obj):
+    store = HDF5Store(path, 'w')
+    try:
+        store.poke('data', obj)
+    finally:
+        store.close()
+
+def read(path):
+    store = HDF5Store(path, 'r')
+    try:
+        return store.peek('data')
+    finally:
+        store.close()
+
+def _best_time(f, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        f()
+        t1 = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        if best is None or t1 - t0 < best:
+            best = t1 - t0
+    return best
+
+def _peak_memory(f):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_workload(make, scale=1., repeat=3, tmpdir=None):
+    """
+    Benchmark a workload.
+
+    Arguments:
+
+        make (callable): function of `scale` that returns the object to serialize.
+
+        scale (float): size factor.
+
+        repeat (int): number of timed writes and reads; the best time is kept.
+
+        tmpdir (str): directory for the temporary file.
+
+    Returns:
+
+        dict: measurements, with keys *write_s*, *read_s*, *records*, *write_records_per_s*,
+            *read_records_per_s*, *write_MB_per_s*, *read_MB_per_s*, *file_bytes*,
+            *write_peak_bytes* and *read_peak_bytes*.
+    """
+    obj = make(scale)
+    path = os.path.join(tmpdir or tempfile.gettempdir(),
+        'rwa_bench_{:d}.h5'.format(os.getpid()))
+    try:
+        write_s = _best_time(lambda: write(path, obj), repeat)
+        read_s = _best_time(lambda: read(path), repeat)
+        write_peak = _peak_memory(lambda: write(path, obj))
+        read_peak = _peak_memory(lambda: read(path))
+        file_bytes = os.path.getsize(path)
+        records = count_records(path)
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+    megabytes = file_bytes / 1e6
+    return OrderedDict((
+        ('write_s',             write_s),
+        ('read_s',              read_s),
+        ('records',             records),
+        ('write_records_per_s', records / write_s),
+        ('read_records_per_s',  records / read_s),
+        ('write_MB_per_s',      megabytes / write_s),
+        ('read_MB_per_s',       megabytes / read_s),
+        ('file_bytes',          file_bytes),
+        ('write_peak_bytes',    write_peak),
+        ('read_peak_bytes',     read_peak),
+        ))
+
+def run(names=None, scale=1., repeat=3, tmpdir=None, verbose=False):
+    """
+    Benchmark several workloads.
+
+    Arguments:
+
+        names (list): workload names; default is all of :data:`workloads`.
+
+        scale, repeat, tmpdir: see :func:`run_workload`.
+
+        verbose (bool): print the name of each workload before it runs.
+
+    Returns:
+
+        OrderedDict: measurements with workload names as keys.
+    """
+    if names is None:
+        names = list(workloads)
+    results = OrderedDict()
+    for name in names:
+        if verbose:
+            print('running {}...'.format(name), file=sys.stderr)
+        results[name] = run_workload(workloads[name], scale, repeat, tmpdir)
+    return results
+
+
+def import_time(module='rwa', repeat=5):
+    """
+    Time the import of a module in fresh interpreters.
+
+    Arguments:
+
+        module (str): module name.
+
+        repeat (int): number of interpreters; the best time is kept.
+
+    Returns:
+
+        dict: best import time in seconds (key *import_s*) and the optional
+            dependencies that the import loaded (key *loaded*).
+    """
+    script = ('import sys, time; t0 = time.time(); import {}; t1 = time.time(); '
+        'print(t1 - t0); print(" ".join(m for m in optional_modules if m in sys.modules))')
+    script = 'optional_modules = {!r}; '.format(optional_modules) + script.format(module)
+    best, loaded = None, []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', script])
+        lines = out.decode('utf-8').splitlines()
+        t = float(lines[0])
+        if best is None or t < best:
+            best = t
+        loaded = lines[1].split() if lines[1:] else []
+    return OrderedDict((('import_s', best), ('loaded', loaded)))
+
+optional_modules = ('pandas', 'scipy', 'tables')
+
+
+def compare(results, baseline, tolerance=.25):
+    """
+    Find the workloads that are slower than in a baseline.
+
+    Arguments:
+
+        results (dict): measurements as returned by :func:`run`.
+
+        baseline (dict): reference measurements.
+
+        tolerance (float): relative slowdown above which a time is flagged.
+
+    Returns:
+
+        list: (workload, metric, ratio) triples, where `ratio` is the measured time
+            divided by the baseline time.
+    """
+    regressions = []
+    for name, measures in results.items():
+        reference = baseline.get(name, None)
+        if not reference:
+            continue
+        for metric in ('write_s', 'read_s', 'import_s'):
+            if reference.get(metric) and measures.get(metric):
+                ratio = measures[metric] / reference[metric]
+                if 1. + tolerance < ratio:
+                    regressions.append((name, metric, ratio))
+    return regressions
+
+
+def format_table(results, baseline=None):
+    columns = ('write_s', 'read_s', 'records', 'write_records_per_s', 'read_records_per_s',
+        'write_MB_per_s', 'read_MB_per_s', 'file_bytes', 'write_peak_bytes', 'read_peak_bytes')
+    header = ['workload'] + list(columns)
+    if baseline is not None:
+        header += ['write_ratio', 'read_ratio']
+    rows = [header]
+    for name, measures in results.items():
+        row = [name]
+        for c in columns:
+            val = measures[c]
+            if val is None:
+                row.append('-')
+            elif isinstance(val, float):
+                row.append('{:.4g}'.format(val))
+            else:
+                row.append(str(val))
+        if baseline is not None:
+            reference = baseline.get(name, {})
+            for metric in ('write_s', 'read_s'):
+                if reference.get(metric):
+                    row.append('{:.2f}'.format(measures[metric] / reference[metric]))
+                else:
+                    row.append('-')
+        rows.append(row)
+    widths = [ max(len(row[j]) for row in rows) for j in range(len(header)) ]
+    return '\n'.join( '  '.join(cell.rjust(w) if j else cell.ljust(w)
+            for j, (cell, w) in enumerate(zip(row, widths))) for row in rows )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m rwa.bench',
+        description='benchmark HDF5Store poke/peek throughput')
+    parser.add_argument('--scale', type=float, default=1., help='workload size factor')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs')
+    parser.add_argument('--only', nargs='*', choices=list(workloads), metavar='NAME',
+        help='workloads to run, among: {}'.format(', '.join(workloads)))
+    parser.add_argument('--import-time', action='store_true',
+        help='also time `import rwa` in fresh interpreters')
+    parser.add_argument('--save', metavar='FILE', help='save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=.25,
+        help='relative slowdown flagged as a regression')
+    parser.add_argument('--tmpdir', help='directory for temporary files')
+    args = parser.parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+    tmpdir = args.tmpdir
+    if tmpdir is None:
+        tmpdir = tempfile.mkdtemp()
+    try:
+        results = run(args.only, args.scale, args.repeat, tmpdir, verbose=True)
+    finally:
+        if args.tmpdir is None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    if results:
+        print(format_table(results, baseline))
+    if args.import_time:
+        results['import'] = import_time(repeat=max(args.repeat, 5))
+        print('import rwa: {:.4g} s; optional dependencies loaded: {}'.format(
+            results['import']['import_s'], ', '.join(results['import']['loaded']) or 'none'))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(dict(scale=args.scale, repeat=args.repeat, results=results), f, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, ratio in regressions:
+            print('regression: {} {} is {:.2f}x the baseline'.format(name, metric, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
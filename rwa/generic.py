@@ -2,10 +2,11 @@
 import six
 from .storable import *
 from collections import namedtuple, deque, OrderedDict
-import copy
 import warnings
 import traceback
 import importlib
+import os
+import time
 
 
 numtypes = (int, float, complex)
@@ -18,7 +19,7 @@ except NameError: # Py3
 basetypes = (bool, ) + numtypes + strtypes
 
 
-rwa_params = dict()
+rwa_params = Params()
 
 
 class ExplicitNone(object):
@@ -29,49 +30,287 @@ class ExplicitNone(object):
         pass
 
 
-def isreference(a):
+def isreference(a, immutables=False):
     """
-    Tell whether a variable is an object reference.
+    Tell whether a variable is an object reference, that should be serialized once and
+    linked to wherever it appears again.
 
-    Due to garbage collection, some objects happen to get the id of a distinct variable.
-    As a consequence, linking is not ready yet and `isreference` returns ``False``.
+    Scalars (including numpy scalars and 0-d arrays), strings and ``None`` are not.
+
+    Arguments:
+
+        a (any): object.
+
+        immutables (bool): whether tuples and frozensets are references.
+
+    Returns:
+
+        bool: ``True`` if `a` is a reference.
+
+    As the ids of objects are compared, the caller should keep the references alive.
     """
-    return False
-    return id(a) != id(copy.copy(a))
-    check = ('__dict__', '__slots__')
-    for attr in check:
-        try:
-            getattr(a, attr)
-        except (SystemExit, KeyboardInterrupt):
-            raise
-        except:
-            pass
-        else:
-            return True
-    return False
+    if a is None or isinstance(a, basetypes) or getattr(a, 'ndim', None) == 0:
+        return False
+    if isinstance(a, (tuple, frozenset)):
+        return immutables
+    return True
 
 
+lookup_type_cache_size = 1024
+
+_python_types = OrderedDict()
+
 def lookup_type(storable_type):
     """
     Look for the Python type that corresponds to a storable type name.
+
+    Names that resolve to objects other than types (e.g. functions) give ``None``.
+    Results are cached, including ``None`` for types that cannot be found.
+    Use :func:`lookup_type.cache_clear` to empty the cache.
     """
-    if storable_type.startswith('Python'):
+    if isinstance(storable_type, bytes) and not isinstance(storable_type, str):
+        storable_type = storable_type.decode('utf-8')
+    try:
+        return _python_types[storable_type]
+    except KeyError:
+        pass
+    python_type = _lookup_type(storable_type)
+    if lookup_type_cache_size <= len(_python_types):
+        _python_types.popitem(last=False)
+    _python_types[storable_type] = python_type
+    return python_type
+
+lookup_type.cache_clear = _python_types.clear
+
+def _lookup_type(storable_type):
+    if storable_type.startswith('Python.'):
         _, module_name = storable_type.split('.', 1)
     else:
         module_name = storable_type
-    #type_name, module_name = \
-    names = [ _name[::-1] for _name in module_name[::-1].split('.', 1) ]
-    if names[1:]:
-        type_name, module_name = names
-    else:
-        type_name = names[0]
-        return eval(type_name)
+    module_name, _, type_name = module_name.rpartition('.')
+    if not module_name:
+        # builtin type, or type with the same name as its module (see `format_type`)
+        python_type = getattr(six.moves.builtins, type_name, None)
+        if isinstance(python_type, type):
+            return python_type
+        module_name = type_name
     try:
         module = importlib.import_module(module_name)
         python_type = getattr(module, type_name)
     except (ImportError, AttributeError):
-        python_type = None
-    return python_type
+        return None
+    # types only, e.g. not functions
+    return python_type if isinstance(python_type, type) else None
+
+
+def _stack_name(objname):
+    if objname is None:
+        return ''
+    if isinstance(objname, bytes) and not isinstance(objname, str):
+        return objname.decode('utf-8')
+    return str(objname)
+
+try:
+    _clock = time.perf_counter
+except AttributeError: # Py2
+    _clock = time.time
+
+
+class StoreStats(object):
+    """
+    Per-type counters of the :meth:`~GenericStore.poke` and :meth:`~GenericStore.peek`
+    calls of a store, see :attr:`GenericStore.stats`.
+
+    Counters are kept separately for the *poke* and *peek* operations, with storable types
+    (or formatted Python types for natively stored objects) as keys.
+    Each type has the following counters:
+
+    * *calls*: number of records;
+    * *time*: wall time in seconds, including the nested records of other types;
+    * *self time*: wall time in seconds, excluding all the nested records;
+    * *bytes*: storage size of the datasets written or read;
+    * *groups*, *datasets* and *attrs*: numbers of groups, datasets and attributes,
+      excluding those of the nested records.
+
+    Records (and bytes) are counted by the store, see :meth:`GenericStore.countRecords`.
+    Times exclude the counting.
+
+    With ``trace=True``, every record is also logged as a timed event, for export
+    with :meth:`writeChromeTrace`, and self times are accumulated per stack of types,
+    for export with :meth:`writeCollapsedStacks`.
+
+    Attributes:
+
+        counters (dict): raw counters, with operations and types as keys.
+
+        records (set): identifiers of the records already counted, so that
+            the records that are linked to several times are counted once.
+
+        events (list): (operation, path, type, start time, duration, bytes) tuples
+            in order of completion, or ``None`` if not tracing.
+
+        stacks (dict): self times with (operation, type, type, ...) tuples as keys,
+            or ``None`` if not tracing.
+
+    """
+    __slots__ = ('counters', 'records', 'events', 'stacks', '_stack', '_active',
+            '_overhead')
+
+    fields = ('calls', 'time', 'self time', 'bytes', 'groups', 'datasets', 'attrs')
+
+    def __init__(self, trace=False):
+        self.counters = {'poke': {}, 'peek': {}}
+        self.records = set()
+        self.events = [] if trace else None
+        self.stacks = {} if trace else None
+        self._stack = []
+        self._active = {}
+        self._overhead = 0.
+
+    def clear(self):
+        for counters in self.counters.values():
+            counters.clear()
+        self.records.clear()
+        if self.events is not None:
+            del self.events[:]
+            self.stacks.clear()
+
+    def clock(self):
+        """
+        Time in seconds, not including the time spent in counting records.
+        """
+        return _clock() - self._overhead
+
+    def begin(self, key=None, objname=None):
+        """
+        Starts timing a record.
+
+        `key` is the type of the record, or ``None`` if known only at :meth:`end`.
+        """
+        if key is not None:
+            self._active[key] = self._active.get(key, 0) + 1
+        # key, start time, time in children, paths of the children records, name
+        self._stack.append([key, self.clock(), 0., set(), objname])
+
+    def end(self, store, operation, objname, container, key=None):
+        """
+        Stops timing a record and counts its groups, datasets and attributes.
+        """
+        stop = self.clock()
+        _key, start, children_time, children, _ = entry = self._stack.pop()
+        if _key is None:
+            _key = entry[0] = key
+        else:
+            self._active[_key] -= 1
+        elapsed = stop - start
+        counters = self.counters[operation].get(_key, None)
+        if counters is None:
+            counters = self.counters[operation][_key] = [0] * len(self.fields)
+        counters[0] += 1
+        if not self._active.get(_key, 0):
+            # nested records of the same type are timed by the outermost record
+            counters[1] += elapsed
+        counters[2] += elapsed - children_time
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        try:
+            path, counts = store.countRecords(objname, container, children, self.records)
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except Exception:
+            path, counts = None, ()
+        for i, count in enumerate(counts, 3):
+            counters[i] += count
+        if self._stack and path is not None:
+            self._stack[-1][3].add(path)
+        if self.events is not None:
+            self._trace(operation, entry, stop, counts[0] if counts else 0)
+        # do not time the counting
+        self._overhead += _clock() - self._overhead - stop
+
+    def _trace(self, operation, entry, stop, nbytes):
+        key, start, children_time, _, objname = entry
+        names = [ _stack_name(e[4]) for e in self._stack ] + [ _stack_name(objname) ]
+        self.events.append((operation, '/'.join(names), key, start, stop - start, nbytes))
+        stack = (operation, ) + tuple( e[0] for e in self._stack ) + (key, )
+        self.stacks[stack] = self.stacks.get(stack, 0.) + stop - start - children_time
+
+    def chromeTrace(self):
+        """
+        Returns:
+
+            dict: events in the Chrome trace-event format, that can be dumped in JSON.
+        """
+        pid = os.getpid()
+        origin = min( e[3] for e in self.events ) if self.events else 0.
+        events = []
+        for operation, path, key, start, duration, nbytes in self.events:
+            events.append(dict(name=path.rsplit('/', 1)[-1], cat=operation, ph='X', \
+                ts=(start - origin) * 1e6, dur=duration * 1e6, pid=pid, tid=0, \
+                args=dict(path=path, type=key, bytes=nbytes)))
+        # parents first, for viewers that expect sorted events
+        events.sort(key=lambda e: (e['ts'], -e['dur']))
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def writeChromeTrace(self, path):
+        """
+        Writes the events in a JSON file in the Chrome trace-event format, that can be
+        opened with ``chrome://tracing``, Perfetto or speedscope.
+        """
+        import json
+        with open(path, 'w') as f:
+            json.dump(self.chromeTrace(), f)
+
+    def collapsedStacks(self):
+        """
+        Returns:
+
+            list: lines in the collapsed-stack format, i.e. semicolon-separated
+                operation and types, and self time in microseconds.
+        """
+        return [ '{} {:d}'.format(';'.join(str(frame).replace(';', ':') for frame in stack),
+                int(round(self_time * 1e6))) for stack, self_time in self.stacks.items() ]
+
+    def writeCollapsedStacks(self, path):
+        """
+        Writes the self times per stack of types in a text file in the collapsed-stack
+        format, for *flamegraph.pl*, speedscope or similar tools.
+        """
+        with open(path, 'w') as f:
+            for line in self.collapsedStacks():
+                f.write(line + '\n')
+
+    def asdict(self):
+        """
+        Returns:
+
+            dict: operation (*poke* or *peek*) → type → counter name → value.
+        """
+        return { operation: { key: dict(zip(self.fields, counters))
+                for key, counters in per_type.items() }
+            for operation, per_type in self.counters.items() }
+
+    def table(self):
+        """
+        Returns:
+
+            str: counters as a text table, with the types sorted by decreasing self time.
+        """
+        header = ('operation', 'type') + self.fields
+        rows = [header]
+        for operation in ('poke', 'peek'):
+            per_type = self.counters[operation]
+            for key in sorted(per_type, key=lambda k: -per_type[k][2]):
+                counters = per_type[key]
+                rows.append((operation, str(key)) + \
+                    tuple( '{:.4f}'.format(c) if isinstance(c, float) else str(c) \
+                        for c in counters ))
+        widths = [ max(len(row[j]) for row in rows) for j in range(len(header)) ]
+        return '\n'.join( '  '.join(cell.ljust(w) if j < 2 else cell.rjust(w)
+                for j, (cell, w) in enumerate(zip(row, widths))) for row in rows )
+
+    def __str__(self):
+        return self.table()
 
 
 class GenericStore(StoreBase):
@@ -88,12 +327,32 @@ class GenericStore(StoreBase):
     Children attribute names are also converted into record references in these
     high-level methods.
 
+    Attributes:
+
+        verbose (bool or int): verbosity level.
+
+        stats (StoreStats): per-type counters, or ``None`` (default) for no profiling.
+            Set to ``StoreStats()`` to collect counters.
+
     """
-    __slots__ = ('verbose', '_stack_active')
+    __slots__ = ('verbose', 'stats', '_peeked')
 
     def __init__(self, storables, verbose=False):
         StoreBase.__init__(self, storables)
         self.verbose = verbose
+        self.stats = None
+        self._peeked = None
+
+    def newCallStack(self):
+        """
+        Make the call stack of a top :meth:`poke` or :meth:`peek` call.
+
+        Stack tracking can be disabled with ``rwa_params['call_stack'] = False``.
+        """
+        if self.storables.params.get('call_stack', True):
+            return CallStack()
+        else:
+            return NoCallStack()
 
     def registerStorable(self, storable):
         if not storable.handlers:
@@ -208,8 +467,63 @@ class GenericStore(StoreBase):
         """
         raise NotImplementedError('abstract method')
 
+    def getRecordType(self, record):
+        """
+        Storable type and version of a record.
+
+        The default implementation reads the 'type' and 'version' record attributes.
+
+        Arguments:
+
+            record (any): record.
+
+        Returns:
+
+            tuple: storable type (str) and version (str), or ``(None, None)`` if the
+                record is native.
+        """
+        t = self.getRecordAttr('type', record)
+        if t is None:
+            return None, None
+        return t, self.getRecordAttr('version', record)
+
+    def setRecordType(self, storable_type, version, record):
+        """
+        Storable type and version setter.
+
+        The default implementation sets the 'type' and 'version' record attributes.
+
+        Arguments:
+
+            storable_type (str): storable type.
+
+            version (str): version number, or ``None``.
+
+            record (any): record.
+
+        """
+        self.setRecordAttr('type', storable_type, record)
+        if version is not None:
+            self.setRecordAttr('version', version, record)
+
+    def hasRecord(self, objname, container):
+        """
+        Tell whether a container has a record.
+
+        Arguments:
+
+            objname (any): record reference.
+
+            container (any): container.
+
+        Returns:
+
+            bool: ``True`` if the record exists.
+        """
+        return objname in container
+
     def isStorable(self, record):
-        return self.getRecordAttr('type', record) is not None
+        return self.getRecordType(record)[0] is not None
 
     def isNativeType(self, obj):
         """
@@ -277,9 +591,10 @@ class GenericStore(StoreBase):
                 if 1 < self.verbose:
                     print(traceback.format_exc())
         else:
-            self.setRecordAttr('type', storable.storable_type, record)
-            if storable.version is not None:
-                self.setRecordAttr('version', from_version(storable.version), record)
+            version = storable.version
+            if version is not None:
+                version = from_version(version)
+            self.setRecordType(storable.storable_type, version, record)
 
     def pokeVisited(self, objname, obj, record, existing, visited=None, _stack=None, **kwargs):
         """
@@ -295,8 +610,8 @@ class GenericStore(StoreBase):
 
             obj (any): object to be serialized.
 
-            existing (any): absolute reference of the record which the object
-                was already serialized into.
+            existing (tuple): container and record reference which the object
+                was already serialized into, and the object itself.
 
             visited (dict): already serialized objects.
 
@@ -319,7 +634,7 @@ class GenericStore(StoreBase):
     def poke(self, objname, obj, record, visited=None, _stack=None, **kwargs):
         top_call = _stack is None
         if top_call:
-            _stack = CallStack()
+            _stack = self.newCallStack()
         try:
             if visited is None:
                 # `visited` is supposed to be a singleton
@@ -327,13 +642,11 @@ class GenericStore(StoreBase):
                 # before it is passed to other namespaces
                 visited = dict()
             if objname == '__dict__':
-                ptr = _stack.pointer
-                # expand the content of the `__dict__` dictionary
+                # expand the content of the `__dict__` dictionary;
+                # each child call rewinds the stack up to __dict__'s parent
                 __dict__ = obj
                 for objname, obj in __dict__.items():
                     self.poke(objname, obj, record, visited=visited, _stack=_stack, **kwargs)
-                    # rewind the stack up to __dict__'s parent
-                    _stack.pointer = ptr
             elif obj is not None:
                 ptr = _stack.add(objname)
                 if self.verbose:
@@ -343,24 +656,39 @@ class GenericStore(StoreBase):
                     print('writing `{}` ({} type: {})'.format(objname, \
                         typetype, type(obj).__name__))
                 objname = self.formatRecordName(objname)
-                if isreference(obj):
+                previous = ancestors = None
+                if isreference(obj, self.storables.params.get('poke.link_immutables', False)):
+                    # ids of the objects being serialized, under a key that is not an id
+                    ancestors = visited.setdefault(None, set())
                     try:
                         previous = visited[id(obj)]
                     except KeyError:
-                        pass
+                        # keep `obj` alive, so that its id is not reused
+                        visited[id(obj)] = (record, objname, obj)
+                        ancestors.add(id(obj))
                     else:
-                        return self.pokeVisited(objname, obj, record, previous, \
+                        if id(obj) in ancestors:
+                            # a link would make a cycle that could not be read back
+                            raise ValueError('self-referencing object: {}'.format(type(obj).__name__))
+                        ancestors = None
+                try:
+                    if previous is not None:
+                        self.pokeVisited(objname, obj, record, previous, \
                             visited=visited, _stack=_stack, **kwargs)
-                    visited[id(obj)] = (record, objname)
-                if self.hasPythonType(obj):
-                    storable = self.byPythonType(obj).asVersion()
-                    self.pokeStorable(storable, objname, obj, record, visited=visited, \
-                        _stack=_stack, **kwargs)
-                elif self.isNativeType(obj):
-                    self.pokeNative(objname, obj, record)
-                else:
-                    self.tryPokeAny(objname, obj, record, visited=visited, \
-                        _stack=_stack, **kwargs)
+                    elif self.stats is None:
+                        self.pokeRecord(objname, obj, record, visited, _stack, **kwargs)
+                    else:
+                        storable = self.pokePlan(obj)
+                        self.stats.begin(format_type(type(obj)) if storable is None \
+                            else storable.storable_type, objname)
+                        try:
+                            self.pokeRecord(objname, obj, record, visited, _stack, **kwargs)
+                        finally:
+                            self.stats.end(self, 'poke', objname, record)
+                finally:
+                    # also if a parent handler catches the exception
+                    if ancestors:
+                        ancestors.discard(id(obj))
                 # rewind the stack
                 _stack.pointer = ptr
         except (SystemExit, KeyboardInterrupt):
@@ -373,6 +701,46 @@ class GenericStore(StoreBase):
             else:
                 raise
 
+    def pokeRecord(self, objname, obj, record, visited, _stack, **kwargs):
+        """
+        Serialize an object that has not been serialized yet.
+
+        See also :meth:`poke`.
+        """
+        storable = self.pokePlan(obj)
+        if storable is not None:
+            self.pokeStorable(storable, objname, obj, record, visited=visited, \
+                _stack=_stack, **kwargs)
+        elif self.isNativeType(obj):
+            self.pokeNative(objname, obj, record)
+        else:
+            self.tryPokeAny(objname, obj, record, visited=visited, \
+                _stack=_stack, **kwargs)
+
+    def countRecords(self, objname, container, skip, counted):
+        """
+        Counts the groups, datasets and attributes of a record and of its children
+        records, for :class:`StoreStats`.
+
+        Arguments:
+
+            objname (any): record reference.
+
+            container (any): parent record.
+
+            skip (set): paths of the children records not to be counted.
+
+            counted (set): identifiers of the records already counted; updated in place.
+
+        Returns:
+
+            tuple: path of the record (or ``None``), and bytes, groups, datasets and
+                attributes counts.
+
+        The default implementation counts nothing.
+        """
+        return None, ()
+
     def tryPokeAny(self, objname, obj, record, visited=None, _stack=None, **kwargs):
         """
         First try to poke with :meth:`pokeNative`.
@@ -419,43 +787,30 @@ class GenericStore(StoreBase):
     def peek(self, objname, container, _stack=None, **kwargs):
         top_call = _stack is None
         if top_call:
-            _stack = CallStack()
+            _stack = self.newCallStack()
+        # records that are linked to several times are deserialized once per top call
+        memo_owner = self._peeked is None
+        if memo_owner:
+            self._peeked = {}
         try:
             ptr = _stack.add(objname)
             record = self.getRecord(self.formatRecordName(objname), container)
-            if self.isStorable(record):
-                t = self.getRecordAttr('type', record)
-                v = self.getRecordAttr('version', record)
-                try:
-                    #print((objname, self.byStorableType(t).storable_type)) # debugging
-                    storable = self.byStorableType(t).asVersion(v)
-                except KeyError:
-                    try:
-                        storable = self.defaultStorable(storable_type=t, version=to_version(v))
-                    except AutoSerialFailure as e:
-                        exc = self.diagnosePeekFailure(container, record, t, v, e)
-                        if exc is None:
-                            pass
-                        else:
-                            exc.__cause__ = None
-                            raise exc
-                try:
-                    obj = self.peekStorable(storable, record, _stack=_stack, **kwargs)
-                except (SystemExit, KeyboardInterrupt):
-                    raise
-                except Exception as e:
-                    if self.verbose:
-                        exc = self.diagnosePeekFailure(container, record, t, v, e)
-                        if exc is None:
-                            pass
-                        else:
-                            exc.__cause__ = None
-                            raise exc
-                    else:
-                        raise
+            key = self.recordId(record)
+            if key is not None and key in self._peeked:
+                obj = self._peeked[key]
             else:
-                #print(objname) # debugging
-                obj = self.peekNative(record)
+                if self.stats is None:
+                    obj = self.peekRecord(container, record, _stack, **kwargs)
+                else:
+                    self.stats.begin(self.getRecordType(record)[0], objname)
+                    obj = None
+                    try:
+                        obj = self.peekRecord(container, record, _stack, **kwargs)
+                    finally:
+                        self.stats.end(self, 'peek', objname, container,
+                            format_type(type(obj)))
+                if key is not None:
+                    self._peeked[key] = obj
             _stack.pointer = ptr
             if isinstance(obj, ExplicitNone):
                 return None
@@ -470,6 +825,56 @@ class GenericStore(StoreBase):
                 raise e_new
             else:
                 raise
+        finally:
+            if memo_owner:
+                self._peeked = None
+
+    def peekRecord(self, container, record, _stack, **kwargs):
+        """
+        Deserialize a record, with no memoization.
+
+        See also :meth:`peek`.
+        """
+        t, v = self.getRecordType(record) # see also `isStorable`
+        if t is not None:
+            try:
+                storable = self.peekPlan(t, v)
+            except KeyError:
+                try:
+                    storable = self.defaultStorable(storable_type=t, version=to_version(v))
+                except AutoSerialFailure as e:
+                    exc = self.diagnosePeekFailure(container, record, t, v, e)
+                    if exc is None:
+                        pass
+                    else:
+                        exc.__cause__ = None
+                        raise exc
+            try:
+                obj = self.peekStorable(storable, record, _stack=_stack, **kwargs)
+            except (SystemExit, KeyboardInterrupt):
+                raise
+            except Exception as e:
+                if self.verbose:
+                    exc = self.diagnosePeekFailure(container, record, t, v, e)
+                    if exc is None:
+                        pass
+                    else:
+                        exc.__cause__ = None
+                        raise exc
+                else:
+                    raise
+        else:
+            #print(objname) # debugging
+            obj = self.peekNative(record)
+        return obj
+
+    def recordId(self, record):
+        """
+        Identity of a record, common to all the links to this record.
+
+        The default implementation returns ``None``, i.e. records are not memoized.
+        """
+        return None
 
     def diagnosePeekFailure(self, container, record, _type, version, exception):
         tab = '  '
@@ -483,7 +888,8 @@ class GenericStore(StoreBase):
         exception.args = [msg] + list(exception.args[1:])
         return exception
 
-    def defaultStorable(self, python_type=None, storable_type=None, version=None, **kwargs):
+    def defaultStorable(self, python_type=None, storable_type=None, version=None,
+            exposes=None, **kwargs):
         """
         Generate a default storable instance.
 
@@ -495,6 +901,8 @@ class GenericStore(StoreBase):
 
             version (tuple): version number of the storable handler.
 
+            exposes (iterable): attributes exposed by the type; default is discovered.
+
         Returns:
 
             StorableHandler: storable instance.
@@ -505,7 +913,7 @@ class GenericStore(StoreBase):
             python_type = lookup_type(storable_type)
         if self.verbose:
             print('generating storable instance for type: {}'.format(python_type))
-        self.storables.registerStorable(default_storable(python_type, \
+        self.storables.registerStorable(default_storable(python_type, exposes=exposes, \
                 version=version, storable_type=storable_type), **kwargs)
         return self.byPythonType(python_type, True).asVersion(version)
 
@@ -526,6 +934,9 @@ def poke(exposes):
 
         callable: serializer (`poke` routine).
     """
+    # attribute and record names
+    names = [ tuple(iobjname) if isinstance(iobjname, (tuple, list)) else (iobjname, iobjname) \
+        for iobjname in exposes ]
     def _poke(store, objname, obj, container, visited=None, _stack=None):
         try:
             sub_container = store.newContainer(objname, obj, container)
@@ -534,11 +945,7 @@ def poke(exposes):
         #except:
         #    raise ValueError('generic poke not supported by store')# from None
         #_stack = _add_to_stack(_stack, objname)
-        for iobjname in exposes:
-            if isinstance(iobjname, (tuple, list)):
-                iobjname, irecname = iobjname
-            else:
-                irecname = iobjname
+        for iobjname, irecname in names:
             try:
                 iobj = getattr(obj, iobjname)
             except AttributeError:
@@ -589,27 +996,36 @@ def poke_assoc(store, objname, assoc, container, visited=None, _stack=None):
 
 
 # peeks
-def default_peek(python_type, exposes, excess_attributes=[]):
+_makers = {}
+
+def default_make(python_type):
     """
-    Autoserializer factory.
+    Finds how to make an object of a given type.
 
-    Works best in Python 3.
+    The result is cached per type.
 
     Arguments:
 
         python_type (type): type constructor.
 
-        exposes (iterable): sequence of attributes.
-
-        excess_attributes (iterable): set of unrequired attributes that might
-            have been serialized by other versions of the provider library.
-
     Returns:
 
-        callable: deserializer (`peek` routine).
+        tuple: callable that makes an object, and a boolean that is ``True`` if this
+            callable takes the sequence of attribute values as input argument.
 
     """
-    with_args = False
+    try:
+        return _makers[python_type]
+    except (KeyError, TypeError):
+        pass
+    maker = _default_make(python_type)
+    try:
+        _makers[python_type] = maker
+    except TypeError: # unhashable
+        pass
+    return maker
+
+def _default_make(python_type):
     make = python_type
     try:
         make()
@@ -623,7 +1039,30 @@ def default_peek(python_type, exposes, excess_attributes=[]):
             raise
         except:
             make = lambda args: python_type.__new__(python_type, *args)
-            with_args = True
+            return make, True
+    return make, False
+
+def default_peek(python_type, exposes, excess_attributes=[]):
+    """
+    Autoserializer factory.
+
+    Works best in Python 3.
+
+    Arguments:
+
+        python_type (type): type constructor.
+
+        exposes (iterable): sequence of attributes.
+
+        excess_attributes (iterable): set of unrequired attributes that might
+            have been serialized by other versions of the provider library.
+
+    Returns:
+
+        callable: deserializer (`peek` routine).
+
+    """
+    make, with_args = default_make(python_type)
     def missing(attr):
         return AttributeError("can't set attribute '{}' ({})".format(attr, python_type))
     if with_args:
@@ -631,7 +1070,7 @@ def default_peek(python_type, exposes, excess_attributes=[]):
             state = []
             for attr in exposes: # force order instead of iterating over `container`
                 #print((attr, attr in container)) # debugging
-                if attr in container:
+                if store.hasRecord(attr, container):
                     state.append(store.peek(attr, container, _stack=_stack))
                 else:
                     state.append(None)
@@ -639,7 +1078,7 @@ def default_peek(python_type, exposes, excess_attributes=[]):
     elif '__dict__' in exposes:
         def peek(store, container, _stack=None):
             obj = make()
-            for attr in container:
+            for attr in store.iterObjectNames(container):
                 val = store.peek(attr, container, _stack=_stack)
                 try:
                     setattr(obj, attr, val)
@@ -653,7 +1092,7 @@ def default_peek(python_type, exposes, excess_attributes=[]):
             obj = make()
             for attr in exposes: # force order instead of iterating over `container`
                 #print((attr, attr in container)) # debugging
-                if attr in container:
+                if store.hasRecord(attr, container):
                     val = store.peek(attr, container, _stack=_stack)
                 else:
                     val = None
@@ -665,6 +1104,57 @@ def default_peek(python_type, exposes, excess_attributes=[]):
             return obj
     return peek
 
+def default_peek_columns(python_type, exposes, excess_attributes=[]):
+    """
+    Autoserializer factory for sequences of objects stored attribute-wise.
+
+    `exposes` should not include ``'__dict__'``.
+
+    Arguments:
+
+        python_type (type): type constructor.
+
+        exposes (iterable): sequence of attributes.
+
+        excess_attributes (iterable): set of unrequired attributes that might
+            have been serialized by other versions of the provider library.
+
+    Returns:
+
+        callable: takes a dictionnary of attribute values (one sequence per attribute)
+            and the number of objects, and returns the list of objects.
+
+    """
+    make, with_args = default_make(python_type)
+    def missing(attr):
+        return AttributeError("can't set attribute '{}' ({})".format(attr, python_type))
+    if with_args:
+        def peek_columns(columns, n):
+            for attr in columns:
+                if attr not in exposes and attr not in excess_attributes:
+                    raise missing(attr)
+            nones = [None] * n
+            states = zip(*[ columns.get(attr, nones) for attr in exposes ])
+            return [ make(state) for state in states ]
+    else:
+        def peek_columns(columns, n):
+            objs = [ make() for _ in range(n) ]
+            for attr in exposes: # force order
+                values = columns.get(attr, None)
+                if values is None:
+                    values = [None] * n
+                try:
+                    for obj, val in zip(objs, values):
+                        setattr(obj, attr, val)
+                except AttributeError:
+                    if attr not in excess_attributes:
+                        raise missing(attr)
+            for attr in columns:
+                if attr not in exposes and attr not in excess_attributes:
+                    raise missing(attr)
+            return objs
+    return peek_columns
+
 def unsafe_peek(init):
     """
     Deserialize all the attributes available in the container and pass them in the same order
@@ -682,7 +1172,8 @@ def unsafe_peek(init):
 
     """
     def peek(store, container, _stack=None):
-        return init(*[ store.peek(attr, container, _stack=_stack) for attr in container ])
+        return init(*[ store.peek(attr, container, _stack=_stack) \
+            for attr in store.iterObjectNames(container) ])
     return peek
 
 def peek_with_kwargs(init, args=[], permissive=False):
@@ -716,13 +1207,13 @@ def peek_with_kwargs(init, args=[], permissive=False):
             return init(\
                 *[ try_peek(store, attr, container, _stack) for attr in args ], \
                 **dict([ (attr, store.peek(attr, container, _stack=_stack)) \
-                    for attr in container if attr not in args ]))
+                    for attr in store.iterObjectNames(container) if attr not in args ]))
     else:
         def peek(store, container, _stack=None):
             return init(\
                 *[ store.peek(attr, container, _stack=_stack) for attr in args ], \
                 **dict([ (attr, store.peek(attr, container, _stack=_stack)) \
-                    for attr in container if attr not in args ]))
+                    for attr in store.iterObjectNames(container) if attr not in args ]))
     return peek
 
 peek_as_dict = peek_with_kwargs(dict)
@@ -850,6 +1341,68 @@ expose_extensions.append(most_exposes)
 expose_extensions.append(namedtuple_exposes)
 
 
+_schemas = {}
+
+def auto_exposes(python_type):
+    """
+    Finds the attributes exposed by the objects of a given type, with the first
+    successful function in :data:`expose_extensions`.
+
+    The result is cached per type, including failures.
+    Call ``auto_exposes.cache_clear()`` after modifying :data:`expose_extensions`.
+
+    Arguments:
+
+        python_type (type): object type.
+
+    Returns:
+
+        list: attributes exposed, or ``None`` if none was found.
+
+    """
+    try:
+        return _schemas[python_type]
+    except KeyError:
+        pass
+    exposes = None
+    for extension in expose_extensions:
+        try:
+            exposes = extension(python_type)
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except:
+            pass
+        else:
+            if exposes:
+                break
+    exposes = list(exposes) if exposes else None
+    _schemas[python_type] = exposes
+    return exposes
+
+auto_exposes.cache_clear = _schemas.clear
+
+def warm_schemas(python_types):
+    """
+    Discovers the attributes exposed by the objects of several types, and how to make
+    these objects, ahead of any auto-serialization.
+
+    Arguments:
+
+        python_types (iterable): types.
+
+    Returns:
+
+        dict: attributes exposed (or ``None``) with the types as keys.
+
+    """
+    schemas = {}
+    for python_type in python_types:
+        schemas[python_type] = exposes = auto_exposes(python_type)
+        if exposes:
+            default_make(python_type)
+    return schemas
+
+
 class AutoSerialFailure(NotImplementedError):
     def __init__(self, msg=None, typ=None):
         self.msg = msg
@@ -885,21 +1438,17 @@ def default_storable(python_type, exposes=None, version=None, storable_type=None
 
     """
     if not exposes:
-        for extension in expose_extensions:
-            try:
-                exposes = extension(python_type)
-            except (SystemExit, KeyboardInterrupt):
-                raise
-            except:
-                pass
-            else:
-                if exposes:
-                    break
+        exposes = auto_exposes(python_type)
         if not exposes:
             raise AutoSerialFailure('`exposes` required for type:', python_type)
+    if peek is default_peek and '__dict__' not in exposes and \
+            all(isinstance(attr, strtypes) for attr in exposes):
+        peek_columns = default_peek_columns(python_type, exposes)
+    else:
+        peek_columns = None
     return Storable(python_type, key=storable_type, \
         handlers=StorableHandler(version=version, exposes=exposes, \
-        poke=poke(exposes), peek=peek(python_type, exposes)))
+        poke=poke(exposes), peek=peek(python_type, exposes), peek_columns=peek_columns))
 
 
 def kwarg_storable(python_type, exposes=None, version=None, storable_type=None, init=None, args=[]):
@@ -1014,6 +1563,7 @@ def force_auto(service, _type):
     version = max(handler.version[0] for handler in storable.handlers) + 1
     _storable = default_storable(_type, version=(version, ))
     storable.handlers.append(_storable.handlers[0])
+    service.clearPlans()
 
 
 # callables
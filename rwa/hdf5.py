@@ -15,10 +15,10 @@ except ImportError:
 import numpy
 import tempfile
 import itertools
+import hashlib
+import importlib
 from .storable import *
 from .generic import *
-from .scipy import *
-from .pandas import *
 from .lazy import FileStore
 from .sequence import *
 
@@ -48,11 +48,303 @@ else:
 to_attr = numpy.bytes_
 from_attr = from_bytes
 
+
+class StoragePolicy(object):
+    '''Dataset layout and filters for array-like records.
+
+    Attributes:
+
+        compression (str or int): h5py compression filter, e.g. ``'gzip'`` or ``'lzf'``.
+
+        compression_opts (any): compression option, e.g. the gzip level.
+
+        shuffle (bool): apply the byte-shuffle filter.
+
+        fletcher32 (bool): apply the checksum filter.
+
+        chunks (bool or int or tuple): chunk shape; ``True`` lets h5py guess the shape,
+            an integer is a target chunk size in bytes.
+            If ``None``, datasets are chunked only if a filter is defined.
+
+        min_size (int): datasets smaller than `min_size` bytes are kept contiguous and
+            unfiltered.
+
+    A policy is applied by :func:`native_poke` and therefore to ndarrays, homogeneous
+    sequences, sparse-matrix buffers and DataFrame columns alike.
+    Scalars, empty arrays and arrays of Python objects are always stored contiguous.
+
+    The active policy is defined by ``rwa_params['hdf5.storage']`` or, for a single
+    :meth:`HDF5Store.poke` call, by its `storage` argument.
+    Both accept a :class:`StoragePolicy` or a dictionnary of policies with Python types
+    as keys (per-type policies).
+    In the latter case, the policy of the innermost record or parent record whose type is
+    a key applies, and key ``None`` designates the default policy.
+
+    Example::
+
+        rwa_params['hdf5.storage'] = {
+            None: StoragePolicy(compression='lzf', min_size=1<<16),
+            pandas.DataFrame: StoragePolicy(compression='gzip', shuffle=True, chunks=1<<20),
+            }
+
+    '''
+    __slots__ = ('compression', 'compression_opts', 'shuffle', 'fletcher32', 'chunks',
+            'min_size')
+
+    def __init__(self, compression=None, compression_opts=None, shuffle=False,
+            fletcher32=False, chunks=None, min_size=0):
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.fletcher32 = fletcher32
+        self.chunks = chunks
+        self.min_size = min_size
+
+    def dataset_kwargs(self, data):
+        '''
+        Keyword arguments for :meth:`h5py.Group.create_dataset`.
+
+        Arguments:
+
+            data (numpy.ndarray): data to be stored.
+
+        Returns:
+
+            dict: keyword arguments.
+        '''
+        if data.ndim == 0 or data.size == 0 or data.dtype.kind == 'O' \
+                or data.nbytes < self.min_size:
+            return {}
+        kwargs = self.filters()
+        chunks = self.chunks
+        if chunks is None:
+            if kwargs:
+                kwargs['chunks'] = True
+        elif chunks is True:
+            kwargs['chunks'] = True
+        elif isinstance(chunks, tuple):
+            if len(chunks) == data.ndim:
+                kwargs['chunks'] = tuple( max(1, min(c, n)) for c, n in zip(chunks, data.shape) )
+            else:
+                kwargs['chunks'] = True
+        elif chunks:
+            kwargs['chunks'] = chunk_shape(data.shape, data.dtype.itemsize, chunks)
+        return kwargs
+
+    def filters(self):
+        '''
+        Filter-related keyword arguments for :meth:`h5py.Group.create_dataset`.
+        '''
+        kwargs = {}
+        if self.compression is not None:
+            kwargs['compression'] = self.compression
+            if self.compression_opts is not None:
+                kwargs['compression_opts'] = self.compression_opts
+        if self.shuffle:
+            kwargs['shuffle'] = True
+        if self.fletcher32:
+            kwargs['fletcher32'] = True
+        return kwargs
+
+
+extendable_chunk_size = 1 << 16
+
+def extendable_kwargs(policy, data):
+    '''
+    Keyword arguments for :meth:`h5py.Group.create_dataset` that make the first dimension
+    of a dataset extendable.
+
+    The filters of the storage policy apply whatever the initial size of the data.
+    Chunks default to about :data:`extendable_chunk_size` bytes.
+
+    Arguments:
+
+        policy (StoragePolicy): storage policy, or ``None``.
+
+        data (numpy.ndarray): initial data, with at least one dimension.
+
+    Returns:
+
+        dict: keyword arguments.
+    '''
+    shape, itemsize = data.shape, data.dtype.itemsize
+    kwargs, chunks = {}, None
+    if policy is not None:
+        if data.dtype.kind != 'O':
+            kwargs = policy.filters()
+        chunks = policy.chunks
+    if isinstance(chunks, tuple) and len(chunks) == data.ndim:
+        chunks = (chunks[0], ) + tuple( min(c, n) for c, n in zip(chunks[1:], shape[1:]) )
+    else:
+        if chunks is None or chunks is True or isinstance(chunks, tuple):
+            chunks = extendable_chunk_size
+        rows = chunks // max(1, itemsize * int(numpy.prod(shape[1:])))
+        chunks = chunk_shape((max(1, rows), ) + shape[1:], itemsize, chunks)
+    kwargs['chunks'] = tuple( max(1, c) for c in chunks )
+    kwargs['maxshape'] = (None, ) + shape[1:]
+    return kwargs
+
+
+def cast_rows(rows, dtype, objname):
+    '''
+    Converts rows to the data type of an extendable record.
+
+    Raises:
+
+        ValueError: if the conversion alters any value (e.g. truncates floats or strings).
+    '''
+    data = numpy.asarray(rows)
+    if data.dtype == dtype or numpy.can_cast(data.dtype, dtype, casting='safe'):
+        return data.astype(dtype, copy=False)
+    try:
+        with numpy.errstate(all='ignore'):
+            cast = data.astype(dtype)
+            equal = cast.astype(data.dtype) == data
+        if data.dtype.kind in 'fc':
+            equal |= numpy.isnan(data)
+        lossless = bool(numpy.all(equal))
+    except (TypeError, ValueError):
+        lossless = False
+    if not lossless:
+        raise ValueError("cannot convert rows of type {} to the type {} of record '{}' "
+            "with no loss".format(data.dtype, dtype, objname))
+    return cast
+
+
+def chunk_shape(shape, itemsize, size):
+    '''
+    Chunk shape that does not exceed a given size in bytes, if possible.
+
+    The leading dimensions are split first, so that chunks span whole rows
+    (or frames) where possible.
+    '''
+    chunks = list(shape)
+    nbytes = itemsize * int(numpy.prod(shape))
+    for axis, n in enumerate(shape):
+        if nbytes <= size:
+            break
+        unit = nbytes // n
+        chunks[axis] = max(1, min(n, size // unit))
+        nbytes = unit * chunks[axis]
+    return tuple(chunks)
+
+
+small_object_size = 1024
+small_object_prefix = 'value:'
+
+def compact_poke(service, objname, data, container):
+    '''
+    Makes a compact dataset for a scalar, if ``rwa_params['hdf5.small_objects'] == 'compact'``.
+
+    The data of compact datasets is stored in the object header, with no separate
+    storage block.
+
+    Returns:
+
+        bool: ``True`` if the dataset was created.
+    '''
+    try:
+        mode = service.storables.params.get('hdf5.small_objects', None)
+    except AttributeError:
+        return False
+    if mode != 'compact':
+        return False
+    data = numpy.asarray(data)
+    if data.ndim != 0 or data.dtype.kind in 'OU' or small_object_size < data.nbytes:
+        # text has no fixed-size HDF5 equivalent; let h5py pick a variable-length type
+        return False
+    # h5py ignores the creation property list of scalar datasets
+    dcpl = h5py.h5p.create(h5py.h5p.DATASET_CREATE)
+    dcpl.set_layout(h5py.h5d.COMPACT)
+    dcpl.set_obj_track_times(False)
+    dataset = h5py.h5d.create(container.id, to_binary(objname).tobytes(),
+        h5py.h5t.py_create(data.dtype, logical=True),
+        h5py.h5s.create(h5py.h5s.SCALAR), dcpl=dcpl)
+    dataset.write(h5py.h5s.ALL, h5py.h5s.ALL, data)
+    return True
+
+def to_small_attr(obj):
+    '''
+    Attribute value for a scalar object, or ``None`` if the object cannot be stored
+    as an attribute.
+    '''
+    _type = type(obj)
+    if _type is bool:
+        return numpy.bool_(obj)
+    elif _type in six.integer_types:
+        if -(1 << 63) <= obj < (1 << 63):
+            return numpy.int64(obj)
+    elif _type is float:
+        return numpy.float64(obj)
+    elif _type is complex:
+        return numpy.complex128(obj)
+    elif _type is six.text_type:
+        try:
+            size = len(obj.encode('utf-8'))
+        except UnicodeEncodeError:
+            return None
+        if size <= small_object_size:
+            return obj
+    elif _type is six.binary_type:
+        # fixed-length strings are NUL-padded
+        if obj and len(obj) <= small_object_size and b'\0' not in obj:
+            return numpy.bytes_(obj)
+    return None
+
+def from_small_attr(val):
+    if isinstance(val, numpy.bytes_):
+        return bytes(val)
+    elif isinstance(val, numpy.generic):
+        return val.item()
+    return val
+
+
+class AttrRecord(object):
+    '''
+    Record for an object stored as an attribute of its container.
+    '''
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
 def native_poke(service, objname, obj, container, *args, **kargs):
-    container.create_dataset(objname, data=obj)
+    try:
+        policy = service.storagePolicy()
+    except AttributeError:
+        policy = None
+    if not isinstance(obj, numpy.ndarray) and compact_poke(service, objname, obj, container):
+        pass
+    elif policy is None:
+        container.create_dataset(objname, data=obj)
+    else:
+        data = numpy.asarray(obj)
+        if data.dtype.kind == 'O':
+            container.create_dataset(objname, data=obj)
+        else:
+            container.create_dataset(objname, data=data, **policy.dataset_kwargs(data))
 
 def string_poke(service, objname, obj, container, *args, **kargs):
-    container.create_dataset(objname, data=to_binary(obj))
+    data = to_binary(obj)
+    if not compact_poke(service, objname, data, container):
+        container.create_dataset(objname, data=data)
+
+def array_poke(service, objname, obj, container, *args, **kargs):
+    try:
+        pooled = service.pokePooled(objname, obj, container)
+    except AttributeError:
+        pooled = False
+    if not pooled:
+        native_poke(service, objname, obj, container)
+
+def binary_poke(service, objname, obj, container, *args, **kargs):
+    try:
+        pooled = service.pokePooled(objname, to_binary(obj), container)
+    except AttributeError:
+        pooled = False
+    if not pooled:
+        string_poke(service, objname, obj, container)
 
 def vlen_poke(service, objname, obj, container, *args, **kargs):
     dt = h5py.special_dtype(vlen=type(obj))
@@ -95,6 +387,217 @@ def mk_native_peek(f):
 
 
 
+class ArrayProxy(object):
+    '''Read-only ndarray-like view of an array dataset.
+
+    Indexing reads only the selected hyperslab from the file.
+    Slices, integers, ellipsis, new axes and integer or boolean index arrays are supported,
+    with the semantics of :mod:`numpy` indexing.
+    The whole array is read by :func:`numpy.asarray`.
+
+    The proxy is valid as long as the store it comes from is open.
+
+    Attributes:
+
+        dataset (h5py.Dataset): underlying dataset.
+
+    '''
+    __slots__ = ('dataset',)
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def dtype(self):
+        return self.dataset.dtype
+
+    @property
+    def ndim(self):
+        return len(self.dataset.shape)
+
+    @property
+    def size(self):
+        return self.dataset.size
+
+    @property
+    def nbytes(self):
+        return self.dataset.size * self.dataset.dtype.itemsize
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.dataset[...]
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+        return array
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return '<ArrayProxy {}: shape {}, type "{}">'.format(
+            self.dataset.name, self.shape, self.dtype.str)
+
+    def __getitem__(self, key):
+        selection, residual = hyperslab(key, self.shape)
+        if selection is None:
+            # unsupported selection; read everything
+            return self.__array__()[key]
+        array = self.dataset[selection]
+        if residual is not None:
+            array = array[residual]
+        return array
+
+
+def hyperslab(key, shape):
+    '''
+    Split a :mod:`numpy` index into an h5py selection and a residual index.
+
+    Arguments:
+
+        key (any): numpy index.
+
+        shape (tuple): array shape.
+
+    Returns:
+
+        tuple: h5py-compatible selection (tuple, or ``None`` if not supported)
+            and residual index (tuple, or ``None`` if not required) to be applied
+            to the array read from the selection.
+    '''
+    if not isinstance(key, tuple):
+        key = (key,)
+    # convert index arrays and expand the ellipsis
+    _key, ellipsis, masks = [], False, {}
+    for k in key:
+        if k is Ellipsis:
+            if ellipsis:
+                return None, None
+            ellipsis = True
+        elif k is not None and not isinstance(k, (slice, six.integer_types, numpy.integer)):
+            k = numpy.asarray(k)
+            if k.dtype == bool:
+                if k.ndim != 1:
+                    return None, None
+                # the mask length is checked once the axis is known
+                size, k = k.size, numpy.flatnonzero(k)
+                masks[id(k)] = size
+            elif k.dtype.kind not in 'iu':
+                return None, None
+        _key.append(k)
+    naxes = sum( 1 for k in _key if k is not None and k is not Ellipsis )
+    if len(shape) < naxes:
+        raise IndexError('too many indices for array')
+    if ellipsis:
+        i = [ k is Ellipsis for k in _key ].index(True)
+        _key[i:i+1] = [slice(None)] * (len(shape) - naxes)
+    else:
+        _key += [slice(None)] * (len(shape) - naxes)
+    advanced = sum( 1 for k in _key if isinstance(k, numpy.ndarray) )
+    selection, residual = [], []
+    trivial = True
+    axis = 0
+    for k in _key:
+        if k is None:
+            residual.append(None)
+            trivial = False
+            continue
+        n = shape[axis]
+        axis += 1
+        if isinstance(k, slice):
+            r = range(*k.indices(n))
+            if not r:
+                selection.append(slice(0, 0))
+                residual.append(slice(None))
+            elif 0 < r.step:
+                selection.append(slice(r.start, r.stop, r.step))
+                residual.append(slice(None))
+            else:
+                selection.append(slice(r[-1], r[0]+1, -r.step))
+                residual.append(slice(None, None, -1))
+                trivial = False
+        elif isinstance(k, numpy.ndarray):
+            if masks.get(id(k), n) != n:
+                raise IndexError('boolean index of size {} does not match axis of size {}'.format(
+                    masks[id(k)], n))
+            k = numpy.where(k < 0, k + n, k)
+            if k.size and (k.min() < 0 or n <= k.max()):
+                raise IndexError('index out of bounds for axis with size {}'.format(n))
+            trivial = False
+            if not k.size:
+                selection.append(slice(0, 0))
+                residual.append(k)
+            elif advanced == 1:
+                # h5py supports a single increasing list of indices
+                unique, inverse = numpy.unique(k, return_inverse=True)
+                selection.append(unique.tolist())
+                residual.append(inverse.reshape(k.shape))
+            else:
+                first = int(k.min())
+                selection.append(slice(first, int(k.max())+1))
+                residual.append(k - first)
+        else:
+            k = int(k)
+            if k < 0:
+                k += n
+            if not 0 <= k < n:
+                raise IndexError('index {} is out of bounds for axis with size {}'.format(k, n))
+            if advanced:
+                # keep numpy's rules for mixing integers and index arrays
+                selection.append(slice(k, k+1))
+                residual.append(0)
+            else:
+                selection.append(k)
+    if advanced or not trivial:
+        residual = tuple(residual)
+    else:
+        residual = None
+    return tuple(selection), residual
+
+
+def memory_map(dataset):
+    '''
+    Read-only memory map of a dataset.
+
+    Only contiguous datasets with no filters, stored in a file on disk, can be mapped.
+
+    Arguments:
+
+        dataset (h5py.Dataset): dataset.
+
+    Returns:
+
+        numpy.memmap: memory-mapped array, or ``None`` if the dataset cannot be mapped.
+    '''
+    if dataset.chunks is not None or dataset.external or dataset.dtype.hasobject:
+        return None
+    if dataset.file.driver not in ('sec2', 'stdio'):
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None: # data not allocated, or compact layout
+        return None
+    return numpy.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r', offset=offset,
+        shape=dataset.shape)
+
+
+pooled_attr = 'pooled'
+
+def content_digest(data):
+    '''
+    Hexadecimal digest of the type, shape and content of an array.
+    '''
+    h = hashlib.sha256()
+    h.update(to_binary(u'{}{}'.format(data.dtype.str, data.shape)).tobytes())
+    h.update(numpy.ascontiguousarray(data).view(numpy.uint8))
+    return h.hexdigest()
+
+
 def _debug(f):
     def printname(name, obj):
         print(obj.name)
@@ -108,69 +611,93 @@ def _debug(f):
     f.visititems(printname)
 
 
-try:
-    from pandas import read_hdf, Series, DataFrame
-except ImportError:
-    pass
-else:
-    # former default implementation routines
+# former default implementation routines for pandas objects
 
-    def copy_hdf(from_table, to_table, name):
-        from_table.copy(from_table, to_table, name=name)
+def copy_hdf(from_table, to_table, name):
+    from_table.copy(from_table, to_table, name=name)
 
-    def peek_Pandas(service, from_table, *args, **kargs):
-        fd, tmpfilename = tempfile.mkstemp()
-        os.close(fd)
+def peek_Pandas(service, from_table, *args, **kargs):
+    from pandas import read_hdf
+    fd, tmpfilename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        to_table = h5py.File(tmpfilename, 'w')
         try:
-            to_table = h5py.File(tmpfilename, 'w')
-            try:
-                copy_hdf(from_table['root'], to_table, 'root')
-            finally:
-                to_table.close()
-            table = read_hdf(tmpfilename, 'root')
+            copy_hdf(from_table['root'], to_table, 'root')
         finally:
-            os.unlink(tmpfilename)
-        return table
-
-    def poke_Pandas(service, objname, obj, to_table, *args, **kargs):
-        fd, tmpfilename = tempfile.mkstemp()
-        os.close(fd)
+            to_table.close()
+        table = read_hdf(tmpfilename, 'root')
+    finally:
+        os.unlink(tmpfilename)
+    return table
+
+def poke_Pandas(service, objname, obj, to_table, *args, **kargs):
+    fd, tmpfilename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        obj.to_hdf(tmpfilename, 'root')
+        from_table = h5py.File(tmpfilename, 'r', libver='latest')
         try:
-            obj.to_hdf(tmpfilename, 'root')
-            from_table = h5py.File(tmpfilename, 'r', libver='latest')
-            try:
-                copy_hdf(from_table, to_table, objname)
-            finally:
-                from_table.close()
+            copy_hdf(from_table, to_table, objname)
         finally:
-            os.unlink(tmpfilename)
+            from_table.close()
+    finally:
+        os.unlink(tmpfilename)
+
+default_Pandas = StorableHandler(peek=peek_Pandas, poke=poke_Pandas, version=(1,))
+
+# new implementation from :mod:`rwa.generic`
+
+rwa_params['pandas.use_tables'] = False
+
+# modify the existing Storable instances for Series and DataFrame
+# to account for the 'pandas.use_tables' option
+# and the 'pandas.blocks' option
+rwa_params['pandas.blocks'] = True
+
+class PandasStorable(Storable):
+    @property
+    def default_version(self):
+        if self.params.get('pandas.use_tables', None):
+            return (1,)
+        if not self.params.get('pandas.blocks', True):
+            # per-column DataFrame records, readable by earlier versions of rwa
+            return (2,)
+
+
+_pandas_storables = None
+
+def make_pandas_storables():
+    """
+    Storable instances and aliases for :mod:`pandas` types, with the HDF5-specific
+    versions.
 
-    default_Pandas = StorableHandler(peek=peek_Pandas, poke=poke_Pandas, version=(1,))
+    The storable instances are made once.
 
-    # new implementation from :mod:`rwa.generic`
+    Returns:
 
-    rwa_params['pandas.use_tables'] = False
+        tuple: list of storable instances and list of aliases.
+    """
+    global _pandas_storables
+    if _pandas_storables is None:
+        _pandas_storables = _make_pandas_storables()
+    return _pandas_storables
 
-    # modify the existing Storable instances for Series and DataFrame
-    # to account for the 'pandas.use_tables' option
-    class PandasStorable(Storable):
-        @property
-        def default_version(self):
-            if self.params.get('pandas.use_tables', None):
-                return (1,)
-    def _redefine(storable):
-        return copy_storable(storable, PandasStorable)
+def _make_pandas_storables():
+    from .pandas import pandas_storables, pandas_aliases
+    if not pandas_storables:
+        return [], []
+    from pandas import Series, DataFrame
 
-    # change version numbers of the candidate new default implementation
+    # change version numbers of the candidate new default implementations,
+    # so that version 1 designates the PyTables-based implementation
     _pandas_storables = []
     for _s in pandas_storables:
-        assert not _s.handlers[1:]
         if _s.python_type in (Series, DataFrame):
-            _s = _redefine(_s)
-            _s.handlers[0].version = (2,)
+            _s = copy_storable(_s, PandasStorable)
+            for _h in _s.handlers:
+                _h.version = (_h.version[0] + 1, ) + _h.version[1:]
         _pandas_storables.append(_s)
-    pandas_storables = _pandas_storables
-
 
     # test the availability of libhdf5
     try:
@@ -183,31 +710,106 @@ else:
     else:
         #_debug(to_table.file)
 
-        _pandas_storables = []
-        for _s in pandas_storables:
+        for _s in _pandas_storables:
             if _s.python_type in (Series, DataFrame):
                 _s.handlers.append(default_Pandas)
-            _pandas_storables.append(_s)
-        pandas_storables = _pandas_storables
 
-        warnings.filterwarnings('ignore', category=FutureWarning, module='rwa.hdf5', lineno=186)
         try:
             from pandas import Panel # Panel has been flagged deprecated
         except ImportError:
             pass
         else:
-            pandas_storables.append(Storable(Panel, handlers=default_Pandas))
+            _pandas_storables.append(Storable(Panel, handlers=default_Pandas))
+
+    return _pandas_storables, list(pandas_aliases)
+
+def register_pandas_storables(service):
+    """
+    Registers the storable instances for :mod:`pandas` types.
+
+    Called on demand, see :meth:`~rwa.storable.StorableService.registerLazy`.
+    """
+    storables, aliases = make_pandas_storables()
+    for _s in storables:
+        service.registerStorable(_s)
+    for _alias in aliases:
+        service.registerAlias(*_alias)
+
+
+def register_scipy_storables(service):
+    """
+    Registers the storable instances for :mod:`scipy.sparse` and :mod:`scipy.spatial`
+    types.
+
+    Called on demand, see :meth:`~rwa.storable.StorableService.registerLazy`.
+    """
+    from .scipy import sparse_storables, spatial_storables
+    for _s in itertools.chain(sparse_storables, spatial_storables):
+        service.registerStorable(_s)
 
 
 
 string_storables = [\
     Storable(six.binary_type, key='Python.bytes', \
-        handlers=StorableHandler(poke=string_poke, peek=binary_peek)), \
+        handlers=StorableHandler(poke=binary_poke, peek=binary_peek)), \
     Storable(six.text_type, key='Python.unicode', \
         handlers=StorableHandler(poke=string_poke, peek=text_peek))]
 
 numpy_storables += [Storable(numpy.ndarray, \
-        handlers=StorableHandler(poke=native_poke, peek=native_peek))]
+        handlers=StorableHandler(poke=array_poke, peek=native_peek))]
+
+
+# estimated file overhead per element of a variable-length string array (heap pointer
+# and global heap object header), in bytes
+vlen_overhead = 32
+
+def string_array_poke(service, objname, elements, container):
+    '''
+    Makes a dataset for a list of strings of the same type.
+
+    Text is stored as UTF-8.
+    The dataset is fixed-length if the padding costs less than the variable-length overhead.
+    '''
+    text = isinstance(elements[0], six.text_type)
+    if text:
+        data = [ e.encode('utf-8') for e in elements ]
+    else:
+        data = elements
+    # fixed-length strings are NUL-padded and variable-length strings are NUL-terminated
+    if any(b'\0' in e for e in data):
+        raise ValueError('NUL characters in strings')
+    length = max(len(e) for e in data)
+    if length * len(data) <= sum(len(e) for e in data) + vlen_overhead * len(data):
+        native_poke(service, objname, numpy.array(data, dtype='S{:d}'.format(max(1, length))),
+            container)
+    elif text:
+        container.create_dataset(objname, data=numpy.array(elements, dtype=object),
+            dtype=h5py.special_dtype(vlen=six.text_type))
+    else:
+        container.create_dataset(objname, data=numpy.array(elements, dtype=object),
+            dtype=h5py.special_dtype(vlen=six.binary_type))
+
+def string_array_peek(service, container, text):
+    data = container[...].tolist()
+    # fixed-length strings are read as bytes, and so are variable-length strings
+    # in recent versions of h5py
+    if text:
+        return [ e.decode('utf-8') if isinstance(e, bytes) else e for e in data ]
+    else:
+        return [ e if isinstance(e, bytes) else e.encode('utf-8') for e in data ]
+
+_text_type = format_type(six.text_type)
+_binary_type = format_type(six.binary_type)
+_python_scalar_types = set( format_type(t) for t in (bool, float, complex) + six.integer_types )
+
+
+# dictionnaries with at least as many entries, and with homogeneous keys and values,
+# are stored as two arrays
+columnar_dict_size = 64
+
+# sequences with at least as many objects of the same auto-serialized type
+# are stored attribute-wise
+columnar_list_size = 64
 
 
 class SequenceV2(SequenceHandling):
@@ -222,7 +824,7 @@ class SequenceV2(SequenceHandling):
             name = int(name)
         return name
     def iter_records(self, store, container):
-        return container.keys()
+        return store.iterObjectNames(container)
     def suitable_array_element(self, elem):
         #return True # let's delegate to `poke_array`
         return isinstance(elem, (bool, ) + numtypes + numpy_basic_types)
@@ -230,53 +832,146 @@ class SequenceV2(SequenceHandling):
         native_poke(store, name, elements, container, visited, _stack)
         return store.getRecord(name, container)
     def peek_array(self, store, elemtype, container, _stack):
-        #if elemtype is six.text_type:
-        #       return text_peek(store, container)
-        #elif elemtype is six.binary_type:
-        #       return binary_peek(store, container)
-        #else:
+        # also reads the arrays of version 3
+        if elemtype == _text_type:
+            return string_array_peek(store, container, True)
+        elif elemtype == _binary_type:
+            return string_array_peek(store, container, False)
+        elif elemtype in _python_scalar_types:
+            # convert the numpy scalars back, in bulk
+            return container[...].tolist()
+        else:
             return native_peek(store, container, _stack)
 
+class SequenceV3(SequenceV2):
+    """
+    Adds string arrays, columnar dictionnaries and attribute-wise sequences of objects
+    to the layouts of :class:`SequenceV2`.
+    """
+    def suitable_array_element(self, elem):
+        return isinstance(elem, (bool, six.text_type, six.binary_type) + numtypes + \
+            numpy_basic_types)
+    def suitable_columns(self, store, keys, values):
+        return columnar_dict_size <= len(keys) and \
+            self.homogeneous_type(keys) is not None and \
+            self.homogeneous_type(values) is not None
+    def suitable_struct_list(self, store, _list, visited):
+        if len(_list) < columnar_list_size:
+            return None
+        first = next(iter(_list))
+        _type = type(first)
+        if not all( type(x) is _type for x in _list ):
+            return None
+        storable = store.byPythonType(_type, True)
+        if storable is not None:
+            handler = storable.asVersion()
+        elif hasattr(first, '__dict__') or hasattr(first, '__slots__'):
+            # register the default storable, as `tryPokeAny` would do for the first item
+            handler = store.defaultStorable(_type, agnostic=store.isAgnostic(_type))
+        else:
+            return None
+        if handler.peek_columns is None:
+            return None
+        # the objects cannot be referenced individually
+        ids = set( id(x) for x in _list )
+        if len(ids) < len(_list) or (visited and any( i in visited for i in ids )):
+            return None
+        return handler
+    def poke_array(self, store, name, elemtype, elements, container, visited, _stack):
+        if elemtype in (six.text_type, six.binary_type):
+            string_array_poke(store, name, elements, container)
+            return store.getRecord(name, container)
+        return SequenceV2.poke_array(self, store, name, elemtype, elements, container,
+            visited, _stack)
+
+
+# earlier versions of rwa cannot read the layouts of SequenceV3;
+# set to True to write sequences that these versions can read
+rwa_params['hdf5.legacy_sequences'] = False
+
+class SequenceStorable(Storable):
+    @property
+    def default_version(self):
+        if self.params.get('hdf5.legacy_sequences', False):
+            # the latest handler implements SequenceV3, the previous one SequenceV2
+            return sorted( h.version for h in self.handlers )[-2]
+
 _seq_storables_v1 = list(seq_storables)
 _seq_handlers_v2 = SequenceV2().base_handlers()
+_seq_handlers_v3 = SequenceV3().base_handlers()
 seq_storables_v2 = []
 for _type, _handler in _seq_handlers_v2.items():
+    _handlers = [_handler, _seq_handlers_v3[_type]]
     for _i, _storable in enumerate(_seq_storables_v1):
         if _storable.python_type is _type:
             del _seq_storables_v1[_i]
             break
     if _storable.python_type is _type:
-        _storable = copy_storable(_storable)
-        _handler.version = (2,)
-        _storable.handlers.append(_handler)
-    else:
-        _storable = Storable(_type, handlers=_handler)
-    seq_storables_v2.append(_storable)
+        _handlers = _storable.handlers + _handlers
+    # number the handlers 1, 2(, 3)
+    for _i, _handler in enumerate(_handlers):
+        _handler.version = (_i + 1, )
+    seq_storables_v2.append(SequenceStorable(_type, handlers=_handlers))
 if _seq_storables_v1:
     seq_storables_v2 += _seq_storables_v1
 
 
-hdf5_storables = list(itertools.chain(\
+_hdf5_storables = list(itertools.chain(\
     [type_storable], \
     function_storables, \
     string_storables, \
     seq_storables_v2, \
-    numpy_storables, \
-    sparse_storables, \
-    spatial_storables, \
-    pandas_storables))
+    numpy_storables))
+
+_hdf5_aliases = []
 
-hdf5_aliases = pandas_aliases
+# storable instances for optional dependencies, registered on demand,
+# so that `import rwa` does not import these libraries
+hdf5_lazy_storables = [
+    ('scipy', register_scipy_storables),
+    ('pandas', register_pandas_storables)]
 
 
 # global variable
 hdf5_service = StorableService(rwa_params)
-for s in hdf5_storables:
+for s in _hdf5_storables:
     hdf5_service.registerStorable(s)
 
-for s in hdf5_aliases:
+for s in _hdf5_aliases:
     hdf5_service.registerAlias(*s)
 
+for s in hdf5_lazy_storables:
+    hdf5_service.registerLazy(*s)
+
+
+def __getattr__(name):
+    '''
+    Backward-compatible access to the names that involve optional dependencies.
+
+    :data:`hdf5_storables` and :data:`hdf5_aliases` include the storable instances and
+    aliases for :mod:`pandas` and :mod:`scipy` types, and the public names of
+    :mod:`rwa.pandas` and :mod:`rwa.scipy` are available from this module,
+    as before these storable instances were registered on demand.
+    Accessing any of these names imports pandas and scipy.
+
+    ``from rwa.hdf5 import *`` does not import these names.
+    '''
+    if name.startswith('_'):
+        raise AttributeError(name)
+    if name == 'hdf5_storables':
+        from .scipy import sparse_storables, spatial_storables
+        return list(itertools.chain(_hdf5_storables, sparse_storables, spatial_storables,
+            make_pandas_storables()[0]))
+    elif name == 'hdf5_aliases':
+        return _hdf5_aliases + make_pandas_storables()[1]
+    for module in ('scipy', 'pandas'):
+        module = importlib.import_module('.' + module, __package__)
+        try:
+            return getattr(module, name)
+        except AttributeError:
+            pass
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
 def hdf5_storable(type_or_storable, *args, **kwargs):
     '''Registers a `Storable` instance in the global service.'''
     if not isinstance(type_or_storable, Storable):
@@ -290,6 +985,17 @@ def hdf5_not_storable(_type, *args, **kwargs):
 
 hdf5_agnostic_modules = []
 
+attr_cache_size = 16
+
+# container types that are passed array proxies with ``lazy='array'``;
+# the other storables are passed loaded arrays
+proxy_containers = {tuple, list, frozenset, set, deque, dict, OrderedDict, defaultdict, Counter}
+
+type_table_attr = 'storable types'
+type_code_dtype = numpy.int32
+
+schema_table_attr = 'storable schemas'
+
 
 
 class HDF5Store(FileStore):
@@ -304,12 +1010,36 @@ class HDF5Store(FileStore):
         hdf5 = HDF5Store(my_file, 'r')
         any_object = hdf5.peek('my_object')
 
+    With ``stats=True``, per-type counters are collected in :attr:`stats`
+    (see :class:`~rwa.generic.StoreStats`) and remain available after :meth:`close`::
+
+        hdf5 = HDF5Store(my_file, 'w', stats=True)
+        hdf5.poke('my_object', any_object)
+        hdf5.close()
+        print(hdf5.stats)
+
+    With ``trace=True``, the counters also include a trace of the records, that can be
+    exported with :meth:`~rwa.generic.StoreStats.writeChromeTrace` or
+    :meth:`~rwa.generic.StoreStats.writeCollapsedStacks`.
+
     '''
-    __slots__ = ()
+    __slots__ = ('_storage', '_poke_types', '_array_mode', '_attrs', '_type_table',
+            '_type_codes', '_pool', '_pool_index', '_schemas')
 
-    def __init__(self, resource, mode='auto', verbose=False, **kwargs):
+    def __init__(self, resource, mode='auto', verbose=False, stats=False, trace=False,
+            **kwargs):
         FileStore.__init__(self, hdf5_service, resource, mode=mode, verbose=verbose, **kwargs)
+        if stats or trace:
+            self.stats = StoreStats(trace=trace)
         self.lazy = False # for backward compatibility
+        self._storage = None
+        self._poke_types = []
+        self._array_mode = None
+        self._attrs = None
+        self._type_table = self._type_codes = None
+        self._pool = None
+        self._pool_index = None
+        self._schemas = None
 
     def writes(self, mode):
         return mode in ('w', 'auto')
@@ -349,6 +1079,15 @@ class HDF5Store(FileStore):
                 e_new.__cause__ = None
                 raise e_new
 
+    def __close__(self, handle):
+        self._pool_index = None
+        try:
+            handle.close()
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
     # backward compatibility property
     @property
     def store(self):
@@ -369,24 +1108,330 @@ class HDF5Store(FileStore):
         return group
 
     def getRecord(self, objname, container):
-        return container[objname]
+        try:
+            return container[objname]
+        except KeyError:
+            # small object?
+            try:
+                val = self.getRecordAttrs(container)[small_object_prefix + to_str(objname)]
+            except (KeyError, AttributeError):
+                raise KeyError(objname)
+            return AttrRecord(from_small_attr(val))
+
+    def hasRecord(self, objname, container):
+        return objname in container or \
+            small_object_prefix + to_str(objname) in self.getRecordAttrs(container)
+
+    def iterObjectNames(self, container):
+        for objname in container:
+            yield objname
+        for attr in self.getRecordAttrs(container):
+            if attr.startswith(small_object_prefix):
+                yield attr[len(small_object_prefix):]
 
     def getRecordAttr(self, attr, record):
-        if attr in record.attrs:
-            #print(('hdf5.getRecordAttr', attr, record.attrs[attr]))
-            return from_attr(record.attrs[attr])
-        else:
+        if self._attrs is None:
+            if attr in record.attrs:
+                #print(('hdf5.getRecordAttr', attr, record.attrs[attr]))
+                return from_attr(record.attrs[attr])
+            else:
+                return None
+        try:
+            return from_attr(self.getRecordAttrs(record)[attr])
+        except KeyError:
             return None
 
+    def getRecordAttrs(self, record):
+        """
+        Reads all the attributes of a record.
+
+        During a :meth:`peek` call, the attributes of the last visited records are cached,
+        so that each record is read once.
+
+        Returns:
+
+            dict: raw attribute values.
+        """
+        if self._attrs is None:
+            return self._readRecordAttrs(record)
+        key = id(record) # records are kept alive in the cache, so that ids are not reused
+        try:
+            _, attrs = self._attrs[key]
+        except KeyError:
+            attrs = self._readRecordAttrs(record)
+            self._attrs[key] = (record, attrs)
+            if attr_cache_size < len(self._attrs):
+                self._attrs.popitem(last=False)
+        else:
+            self._attrs.move_to_end(key)
+        return attrs
+
+    def _readRecordAttrs(self, record):
+        # single pass over the attributes;
+        # the string attributes are read with the low-level API, which is faster
+        attrs = {}
+        oid = record.id
+        def read(name):
+            attr = h5py.h5a.open(oid, name)
+            name = from_bytes(name)
+            dtype = attr.dtype
+            try:
+                if dtype.kind == 'S' and attr.shape == ():
+                    val = numpy.ndarray((), dtype=dtype)
+                    attr.read(val)
+                    attrs[name] = val[()]
+                else:
+                    attrs[name] = record.attrs[name]
+            except (OSError, TypeError):
+                # empty or unsupported attribute
+                pass
+        h5py.h5a.iterate(oid, read)
+        return attrs
+
     def setRecordAttr(self, attr, val, record):
         #record.attrs[attr] = to_attr(val)
         record.attrs.create(attr, to_attr(val))
+        if self._attrs:
+            self._attrs.pop(id(record), None)
         #print(('hdf5.setRecordAttr', record.name, attr, record.attrs[attr])) # DEBUG
 
-    def poke(self, objname, obj, container=None, visited=None, _stack=None, **kwargs):
+    def getRecordType(self, record):
+        if isinstance(record, AttrRecord):
+            return None, None
+        attrs = self.getRecordAttrs(record)
+        try:
+            t = attrs['type']
+        except KeyError:
+            try:
+                code = attrs['type code']
+            except KeyError:
+                return None, None
+            return self.typeTable()[int(code)]
+        v = attrs.get('version', None)
+        return from_attr(t), (None if v is None else from_attr(v))
+
+    def setRecordType(self, storable_type, version, record):
+        if not self.storables.params.get('hdf5.type_table', False) or \
+                record.file != self.store: # shared pool file
+            FileStore.setRecordType(self, storable_type, version, record)
+            return
+        key = (storable_type, version)
+        try:
+            code = self._type_codes[key]
+        except (TypeError, KeyError):
+            table = self.typeTable()
+            code = len(table)
+            table.append(key)
+            self._type_codes[key] = code
+            self.store.attrs[type_table_attr] = numpy.array(
+                [ (t, '' if v is None else v) for t, v in table ], dtype=numpy.bytes_)
+        record.attrs.create('type code', code, dtype=type_code_dtype)
+        if self._attrs:
+            self._attrs.pop(id(record), None)
+
+    def typeTable(self):
+        """
+        File-level table of storable types and versions.
+
+        With ``rwa_params['hdf5.type_table'] = True``, storable types and versions are
+        registered once in the root group, and each record carries a small integer code
+        (attribute 'type code') instead of the 'type' and 'version' string attributes.
+        Files in either format, or mixing both, can be read.
+
+        Returns:
+
+            list: (storable type, version) pairs; the code of a pair is its index.
+        """
+        if self._type_table is None:
+            table = []
+            if type_table_attr in self.store.attrs:
+                for t, v in self.store.attrs[type_table_attr]:
+                    v = from_attr(v)
+                    table.append((from_attr(t), v if v else None))
+            self._type_table = table
+            self._type_codes = { key: code for code, key in enumerate(table) }
+        return self._type_table
+
+    def schemaTable(self):
+        """
+        File-level table of the attributes exposed by the storable types.
+
+        Whenever an object is serialized attribute-wise, the names of its exposed
+        attributes are registered in the root group, so that readers with no storable
+        instance for its type can auto-serialize it with no introspection.
+
+        Returns:
+
+            dict: lists of exposed attributes, with (storable type, version) pairs as keys.
+        """
+        if self._schemas is None:
+            schemas = {}
+            if schema_table_attr in self.store.attrs:
+                for t, v, exposes in self.store.attrs[schema_table_attr]:
+                    schemas[(from_attr(t), to_version(from_attr(v)))] = \
+                        from_attr(exposes).split()
+            self._schemas = schemas
+        return self._schemas
+
+    def _registerSchema(self, storable):
+        schemas = self.schemaTable()
+        key = (storable.storable_type, storable.version)
+        if key in schemas:
+            return
+        exposes = storable.exposes
+        if not all( isinstance(attr, str) and attr and ' ' not in attr for attr in exposes ):
+            # cannot be registered
+            schemas[key] = None
+            return
+        schemas[key] = list(exposes)
+        self.store.attrs[schema_table_attr] = numpy.array(
+            [ (t, from_version(v), ' '.join(exposes)) for (t, v), exposes in schemas.items() \
+                if exposes is not None ], dtype=numpy.bytes_)
+
+    def defaultStorable(self, python_type=None, storable_type=None, version=None,
+            exposes=None, **kwargs):
+        if exposes is None and python_type is None:
+            exposes = self.schemaTable().get((storable_type, version), None)
+        return FileStore.defaultStorable(self, python_type, storable_type, version,
+            exposes=exposes, **kwargs)
+
+    def poke(self, objname, obj, container=None, visited=None, _stack=None, storage=None,
+            **kwargs):
+        """
+        Writes in a container.
+
+        `storage` is a :class:`StoragePolicy` (or dictionnary of per-type policies)
+        that overrides ``rwa_params['hdf5.storage']`` for the present call.
+
+        With ``rwa_params['hdf5.small_objects'] = 'attrs'``, the scalars (bool, int, float,
+        complex and short strings) that are not written at the root of the file are
+        stored as attributes of their container, instead of separate datasets.
+        With ``'compact'``, they are stored as compact datasets instead.
+        Both layouts are read transparently.
+
+        See also :meth:`~rwa.storable.StoreBase.poke`.
+        """
         if container is None:
             container = self.store
-        FileStore.poke(self, objname, obj, container, visited=visited, _stack=_stack, **kwargs)
+        elif objname != '__dict__' and \
+                self.storables.params.get('hdf5.small_objects', None) == 'attrs':
+            val = to_small_attr(obj)
+            if val is not None:
+                container.attrs.create(small_object_prefix + to_str(objname), val)
+                return
+        if storage is None:
+            FileStore.poke(self, objname, obj, container, visited=visited, _stack=_stack,
+                **kwargs)
+        else:
+            previous, self._storage = self._storage, storage
+            try:
+                FileStore.poke(self, objname, obj, container, visited=visited, _stack=_stack,
+                    **kwargs)
+            finally:
+                self._storage = previous
+
+    def pokeStorable(self, storable, objname, obj, container, *args, **kwargs):
+        if storable.exposes:
+            schemas = self._schemas
+            if schemas is None or (storable.storable_type, storable.version) not in schemas:
+                self._registerSchema(storable)
+        # keep track of the parent types for per-type storage policies
+        self._poke_types.append(storable.python_type)
+        try:
+            FileStore.pokeStorable(self, storable, objname, obj, container, *args, **kwargs)
+        finally:
+            self._poke_types.pop()
+
+    def storagePolicy(self):
+        """
+        Storage policy for the dataset to be created.
+
+        Returns:
+
+            StoragePolicy: active policy, or ``None`` for the default contiguous layout.
+        """
+        policy = self._storage
+        if policy is None:
+            policy = self.storables.params.get('hdf5.storage', None)
+        if policy is None or isinstance(policy, StoragePolicy):
+            return policy
+        for _type in reversed(self._poke_types):
+            if _type in policy:
+                return policy[_type]
+        return policy.get(None, None)
+
+    def pokePooled(self, objname, data, container):
+        """
+        Makes a record as a link to a dataset of the content pool.
+
+        With ``rwa_params['hdf5.dedup'] = min_size``, arrays and bytes of at least
+        `min_size` bytes are stored once per content: the first record with a given
+        content is a regular dataset with the digest of its content as attribute
+        'pooled', and the next records are hard links to this dataset.
+        The pool has no group of its own, and the root group contains user records only.
+        With ``rwa_params['hdf5.dedup_pool'] = path``, the pool is a separate file
+        shared by several files, and the records are external links with the absolute
+        path of the pool file.
+
+        Pooled records that are equal in content are read as distinct objects.
+
+        Returns:
+
+            bool: ``True`` if the record was made.
+        """
+        min_size = self.storables.params.get('hdf5.dedup', None)
+        if min_size is None:
+            return False
+        data = numpy.asarray(data)
+        if data.dtype.hasobject or data.nbytes < min_size:
+            return False
+        digest = content_digest(data)
+        path = self.storables.params.get('hdf5.dedup_pool', None)
+        if path is None:
+            index = self.poolIndex()
+            try:
+                container[objname] = self.store[index[digest]]
+            except (KeyError, ValueError):
+                # new content, or the pooled dataset has been unlinked
+                native_poke(self, objname, data, container)
+                dataset = container[objname]
+                self.setRecordAttr(pooled_attr, digest, dataset)
+                index[digest] = dataset.ref
+            return True
+        path = os.path.abspath(os.path.expanduser(path))
+        if self._pool is None:
+            self._pool = h5py.File(path, 'a')
+        elif os.path.abspath(self._pool.filename) != path:
+            self._pool.close()
+            self._pool = h5py.File(path, 'a')
+        pool = self._pool
+        if digest not in pool:
+            native_poke(self, digest, data, pool)
+            self.setRecordAttr(pooled_attr, '1', pool[digest])
+        container[objname] = h5py.ExternalLink(path, '/' + digest)
+        return True
+
+    def poolIndex(self):
+        """
+        Object references of the pooled datasets of the file, with the digests of their
+        contents as keys.
+
+        The index is built from the 'pooled' attributes of the datasets of the file
+        the first time a record is pooled, so that a file opened in mode ``'a'`` keeps
+        deduplicating against the records that it already contains.
+        """
+        if self._pool_index is None:
+            index = {}
+            def visit(name, obj):
+                if isinstance(obj, h5py.Dataset):
+                    digest = obj.attrs.get(pooled_attr, None)
+                    if digest is not None:
+                        digest = from_attr(digest)
+                        if digest != '1': # '1' designates datasets of a pool file
+                            index[digest] = obj.ref
+            self.store.visititems(visit)
+            self._pool_index = index
+        return self._pool_index
 
     def pokeNative(self, objname, obj, container):
         if obj is None:
@@ -401,16 +1446,288 @@ class HDF5Store(FileStore):
             raise TypeError('unsupported type {!s} for object {}'.format(\
                 obj.__class__, objname))
 
+    def append(self, objname, rows, container=None):
+        """
+        Appends rows to an extendable array record, or makes such a record.
+
+        Supported records are arrays and homogeneous lists or tuples of numbers.
+        Arrays grow along their first dimension, and a single row (an array with one
+        dimension less than the record) can also be appended.
+        The rows are converted to the data type of the record, and :class:`ValueError`
+        is raised if the conversion alters any value.
+
+        The file is modified in place; open the store in mode ``'a'`` to extend records
+        from an existing file.
+
+        Arguments:
+
+            objname (str): record name.
+
+            rows (numpy.ndarray or list or tuple): rows to be appended.
+
+            container (h5py.Group): parent container; default is the root group.
+
+        """
+        if container is None:
+            container = self.store
+        self.sane = False
+        self._append(objname, rows, container)
+        self.sane = True
+
+    def _append(self, objname, rows, container):
+        if objname in container:
+            record = container[objname]
+            if not isinstance(record, h5py.Dataset) or not record.maxshape \
+                    or record.maxshape[0] is not None:
+                raise TypeError("record '{}' is not extendable".format(objname))
+            rows = cast_rows(rows, record.dtype, objname)
+            if rows.ndim == record.ndim - 1:
+                rows = rows[numpy.newaxis]
+            if rows.shape[1:] != record.shape[1:]:
+                raise ValueError("cannot append rows of shape {} to record '{}' of shape {}".format(\
+                    rows.shape[1:], objname, record.shape))
+            n = record.shape[0]
+            record.resize(n + rows.shape[0], axis=0)
+            record[n:] = rows
+        else:
+            if isinstance(rows, numpy.ndarray):
+                data = rows if rows.ndim else rows[numpy.newaxis]
+                elemtype = None
+            elif isinstance(rows, (list, tuple)) and rows:
+                elemtype = type(rows[0])
+                if not isinstance(rows[0], (bool, ) + numtypes + numpy_basic_types) or \
+                        not all( type(row) is elemtype for row in rows ):
+                    raise TypeError('only homogeneous sequences of numbers can be extended')
+                data = numpy.asarray(rows)
+            else:
+                raise TypeError('unsupported type {!s} for extendable record {}'.format(\
+                    type(rows), objname))
+            self._poke_types.append(type(rows))
+            try:
+                kwargs = extendable_kwargs(self.storagePolicy(), data)
+            finally:
+                self._poke_types.pop()
+            record = container.create_dataset(objname, data=data, **kwargs)
+            storable = self.byPythonType(rows).asVersion()
+            if elemtype is not None:
+                self.setRecordAttr('homogeneous', '1', record)
+                self.setRecordAttr('element type', format_type(elemtype), record)
+            self.setRecordType(storable.storable_type, from_version(storable.version), record)
+
+    def pokeStream(self, objname, iterable, dtype=None, container=None, buffer_size=8192):
+        """
+        Writes a new record from an iterable of chunks, one chunk at a time.
+
+        The chunks can be:
+
+        * arrays, concatenated along their first dimension,
+        * scalars, buffered and written as a 1D array,
+        * :class:`pandas.DataFrame` row blocks with identical columns; the resulting
+          DataFrame has a default :class:`pandas.RangeIndex` index.
+
+        The record is extendable (see also :meth:`append`).
+        In mode ``'w'``, if the stream fails, the file is discarded on :meth:`close`
+        as for any failed :meth:`poke`.
+
+        Arguments:
+
+            objname (str): record name.
+
+            iterable (iterable): chunks; can be a generator.
+
+            dtype (numpy.dtype): data type of the array record (not for DataFrames);
+                the chunks are converted to this type.
+                Default is inferred from the first chunk, and :class:`ValueError` is
+                raised if a later chunk cannot be converted to it with no loss.
+
+            container (h5py.Group): parent container; default is the root group.
+
+            buffer_size (int): number of scalars written at a time.
+
+        """
+        if container is None:
+            container = self.store
+        if objname in container:
+            raise ValueError("record '{}' already exists".format(objname))
+        # the whole stream is a single write
+        self.sane = False
+        self._pokeStream(objname, iterable, dtype, container, buffer_size)
+        self.sane = True
+
+    def _pokeStream(self, objname, iterable, dtype, container, buffer_size):
+        chunks = iter(iterable)
+        try:
+            first = next(chunks)
+        except StopIteration:
+            if dtype is None:
+                raise ValueError('cannot infer the data type of an empty stream')
+            self._append(objname, numpy.zeros(0, dtype=dtype), container)
+            return
+        chunks = itertools.chain((first, ), chunks)
+        if type(first).__module__.startswith('pandas'):
+            from pandas import DataFrame
+            if isinstance(first, DataFrame):
+                self._pokeDataFrameStream(objname, chunks, container)
+                return
+        if isinstance(first, numpy.ndarray) and first.ndim:
+            for chunk in chunks:
+                self._append(objname, numpy.asarray(chunk, dtype=dtype), container)
+        else:
+            buffer = []
+            for scalar in chunks:
+                buffer.append(scalar)
+                if buffer_size <= len(buffer):
+                    self._append(objname, numpy.asarray(buffer, dtype=dtype), container)
+                    buffer = []
+            if buffer:
+                self._append(objname, numpy.asarray(buffer, dtype=dtype), container)
+
+    def _pokeDataFrameStream(self, objname, blocks, container):
+        # makes a version-2 DataFrame record, with extendable column datasets
+        from pandas import DataFrame, RangeIndex
+        record = self.newContainer(objname, None, container)
+        data = self.newContainer('data', None, record)
+        values = self.newContainer('values', None, data)
+        self.setRecordAttr('homogeneous', '0', values)
+        columns, nrows = None, 0
+        for block in blocks:
+            if not isinstance(block, DataFrame):
+                raise TypeError('not a DataFrame: {!s}'.format(type(block)))
+            if columns is None:
+                columns = list(block.columns)
+            elif list(block.columns) != columns:
+                raise ValueError('the columns differ from those of the first block')
+            for j in range(len(columns)):
+                self._append(str(j), block.iloc[:, j].to_numpy(), values)
+            nrows += len(block)
+        SequenceV2().poke_list_items(self, 'keys', columns, data, {}, CallStack())
+        self.poke('index', RangeIndex(nrows), record)
+        for python_type, obj in ((OrderedDict, data), (DataFrame, record)):
+            storable = self.byPythonType(python_type, True).asVersion((2, ))
+            self.setRecordType(storable.storable_type, from_version(storable.version), obj)
+
     def pokeVisited(self, objname, obj, container, existing, *args, **kwargs):
-        existing_container, existing_objname = existing
-        container[objname] = existing_container[existing_objname] # HDF5 hard link
+        existing_container, existing_objname = existing[:2]
+        try:
+            container[objname] = existing_container[existing_objname] # HDF5 hard link
+        except KeyError:
+            # nothing was written for this object (e.g. not storable)
+            pass
+
+    def peek(self, objname, record=None, _stack=None, lazy=None, **kwargs):
+        """
+        Reads from a container.
+
+        With ``lazy='array'``, array records in plain containers (see `proxy_containers`)
+        are not loaded but returned as :class:`ArrayProxy` objects instead.
+        These proxies read data only on indexing, as long as the store is open.
+
+        With ``lazy='memmap'``, array records are returned as read-only :class:`numpy.memmap`
+        arrays, if their datasets are contiguous and not filtered.
+        Processes mapping the same file share the page cache.
+        Other records are loaded as usual.
 
-    def peek(self, objname, record=None, _stack=None, **kwargs):
+        Records with several hard links are deserialized once per top call, so that the
+        returned objects share references the same way the written objects did.
+
+        See also :meth:`~rwa.storable.StoreBase.peek`.
+        """
         if record is None:
             record = self.store
-        return FileStore.peek(self, objname, record, _stack=_stack, **kwargs)
+        # the record attributes are cached for the duration of the top call
+        top_call = self._attrs is None
+        if top_call:
+            self._attrs = OrderedDict()
+        previous = self._array_mode
+        if lazy in ('array', 'memmap'):
+            self._array_mode, lazy = lazy, None
+        try:
+            return FileStore.peek(self, objname, record, _stack=_stack, lazy=lazy, **kwargs)
+        finally:
+            self._array_mode = previous
+            if top_call:
+                self._attrs = None
+
+    def recordId(self, record):
+        """
+        File number and address of a record that is hard-linked to more than once,
+        or ``None``.
+
+        Pooled datasets (see :meth:`pokePooled`) are not identified.
+        """
+        if isinstance(record, AttrRecord):
+            return None
+        info = h5py.h5o.get_info(record.id)
+        if info.rc < 2 or pooled_attr in self.getRecordAttrs(record):
+            return None
+        return info.fileno, info.addr
+
+    def countRecords(self, objname, container, skip, counted):
+        if container is None:
+            container = self.store
+        path = '/'.join((container.name.rstrip('/'), to_str(objname)))
+        try:
+            link = container.get(objname, getlink=True)
+        except (KeyError, AttributeError):
+            link = None
+        if link is None:
+            # small object stored as an attribute, or nothing written
+            return None, ()
+        counts = [0, 0, 0, 0] # bytes, groups, datasets, attributes
+        def count(path, link, record):
+            if not isinstance(link, h5py.HardLink):
+                # external link to a pooled dataset
+                return
+            info = h5py.h5o.get_info(record.id)
+            key = (info.fileno, info.addr)
+            if key in counted:
+                # hard link
+                return
+            counted.add(key)
+            counts[3] += info.num_attrs
+            if isinstance(record, h5py.Group):
+                counts[1] += 1
+                for name in record:
+                    child_path = '/'.join((path, name))
+                    if child_path not in skip:
+                        count(child_path, record.get(name, getlink=True), record[name])
+            else:
+                counts[0] += record.id.get_storage_size()
+                counts[2] += 1
+        count(path, link, container[objname] if isinstance(link, h5py.HardLink) else None)
+        return path, counts
+
+    def peekStorable(self, storable, record, *args, **kwargs):
+        if self._array_mode is not None:
+            if storable.python_type is numpy.ndarray:
+                return self.peekArray(record)
+            if self._array_mode == 'array' and storable.python_type not in proxy_containers:
+                # the handlers of other types expect actual arrays
+                self._array_mode = None
+                try:
+                    return FileStore.peekStorable(self, storable, record, *args, **kwargs)
+                finally:
+                    self._array_mode = 'array'
+        return FileStore.peekStorable(self, storable, record, *args, **kwargs)
+
+    def peekArray(self, record):
+        """
+        Array proxy or memory map for an array record, depending on the peek mode.
+
+        Scalars are loaded, and so are the arrays that cannot be memory-mapped.
+        """
+        if record.shape == ():
+            return native_peek(self, record)
+        if self._array_mode == 'memmap':
+            array = memory_map(record)
+            if array is None:
+                array = native_peek(self, record)
+            return array
+        return ArrayProxy(record)
 
     def peekNative(self, record):
+        if isinstance(record, AttrRecord):
+            return record.value
         try:
             return native_peek(self, record)
         except AttributeError as e:
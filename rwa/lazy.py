@@ -238,7 +238,7 @@ class FileStore(LazyStore):
                 print('flushing into temporary file: {}'.format(temporary))
             self.temporary = temporary
             self.open_args = (temporary, )
-        elif file_exists:
+        elif file_exists or mode == 'a':
             self.open_args = (resource, )
         else:
             # reading a missing file
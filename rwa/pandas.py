@@ -18,9 +18,9 @@ except ImportError:
     pandas_storables = []
     pandas_aliases = []
 else:
-    rwa_params['pandas.index.force_unicode']   = True
-    rwa_params['pandas.columns.force_unicode'] = True
-    rwa_params['pandas.categories.force_unicode'] = True
+    rwa_params.setdefault('pandas.index.force_unicode', True)
+    rwa_params.setdefault('pandas.columns.force_unicode', True)
+    rwa_params.setdefault('pandas.categories.force_unicode', True)
 
     _unicode = lambda _s: _s.decode('utf-8') if isinstance(_s, bytes) else _s
     def _map(f, seq):
@@ -312,13 +312,7 @@ else:
             service.poke('data', s.values, container, *args, **kwargs)
             service.poke('index', s.index, container, *args, **kwargs)
 
-    # `poke_dataframe` is similar to `poke` but converts part of the dataframe into
-    # an ordered dictionnary of columns
-    def poke_dataframe(service, dfname, df, parent_container, *args, **kwargs):
-        container = service.newContainer(dfname, df, parent_container)
-        data = OrderedDict([ (colname, df[colname].values) for colname in df.columns ])
-        service.poke('data', data, container, *args, **kwargs)
-        service.poke('index', df.index, container, *args, **kwargs)
+    def _poke_extras(service, df, container, *args, **kwargs):
         # new in 0.8.5
         import string
         for extra in df.__dict__:
@@ -329,6 +323,15 @@ else:
                     import logging
                     logging.getLogger().warning(str(e))
 
+    # `poke_dataframe` is similar to `poke` but converts part of the dataframe into
+    # an ordered dictionnary of columns
+    def poke_dataframe(service, dfname, df, parent_container, *args, **kwargs):
+        container = service.newContainer(dfname, df, parent_container)
+        data = OrderedDict([ (colname, df[colname].values) for colname in df.columns ])
+        service.poke('data', data, container, *args, **kwargs)
+        service.poke('index', df.index, container, *args, **kwargs)
+        _poke_extras(service, df, container, *args, **kwargs)
+
     _peek_dataframe = peek(pandas.DataFrame, ['data', 'index'])
     def peek_dataframe(service, container, _stack=None, force_unicode=None):
         df = _peek_dataframe(service, container, _stack=_stack)
@@ -336,13 +339,99 @@ else:
             df.columns = _map(_unicode, df.columns)
         return df
 
+    # block-wise layout: the columns of a same numerical dtype are stored together
+    # as a single 2D array (one row per column), and the other columns
+    # (object and extension dtypes) are stored one by one
+    block_kinds = 'biufc'
+
+    def dataframe_blocks(df):
+        """
+        Positions of the columns of a DataFrame, grouped by numerical dtype.
+
+        Returns:
+
+            OrderedDict, list: positions per dtype, and positions of the other columns.
+        """
+        blocks, others = OrderedDict(), []
+        for j, dtype in enumerate(df.dtypes):
+            if isinstance(dtype, np.dtype) and dtype.kind in block_kinds:
+                blocks.setdefault(dtype, []).append(j)
+            else:
+                others.append(j)
+        return blocks, others
+
+    def _column_values(column):
+        values = column.values
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'O':
+            # arrays of Python objects have no HDF5 equivalent
+            values = values.tolist()
+        return values
+
+    def poke_dataframe_blocks(service, dfname, df, parent_container, *args, **kwargs):
+        container = service.newContainer(dfname, df, parent_container)
+        blocks, others = dataframe_blocks(df)
+        service.poke('columns', df.columns, container, *args, **kwargs)
+        service.poke('index', df.index, container, *args, **kwargs)
+        if blocks:
+            # `to_numpy` does not copy single-block frames, and the transposed array
+            # is the C-contiguous block
+            service.poke('blocks', [ np.ascontiguousarray( \
+                    df.iloc[:, positions].to_numpy(dtype=dtype).T) \
+                for dtype, positions in blocks.items() ], container, *args, **kwargs)
+            service.poke('block positions', [ np.asarray(positions, dtype=np.int64) \
+                for positions in blocks.values() ], container, *args, **kwargs)
+        if others:
+            service.poke('other positions', np.asarray(others, dtype=np.int64), \
+                container, *args, **kwargs)
+            service.poke('other columns', [ _column_values(df.iloc[:, j]) for j in others ], \
+                container, *args, **kwargs)
+        _poke_extras(service, df, container, *args, **kwargs)
+
+    def peek_dataframe_blocks(service, container, _stack=None, force_unicode=None):
+        def _peek(name):
+            try:
+                return service.peek(name, container, _stack=_stack)
+            except KeyError:
+                return []
+        index = service.peek('index', container, _stack=_stack)
+        columns = service.peek('columns', container, _stack=_stack)
+        frames, positions = [], []
+        for block, _positions in zip(_peek('blocks'), _peek('block positions')):
+            # the block is not copied
+            frames.append(pandas.DataFrame(block.T, index=index, columns=_positions, \
+                copy=False))
+            positions.append(_positions)
+        other_positions = _peek('other positions')
+        for j, values in zip(other_positions, _peek('other columns')):
+            if isinstance(values, list):
+                # object column; trailing `None`s are not stored
+                values = values + [None] * (len(index) - len(values))
+                values = pandas.Series(values, index=index, dtype=object)
+            frames.append(pandas.DataFrame({j: values}, index=index))
+        if frames:
+            positions.append(np.asarray(other_positions, dtype=np.int64))
+            positions = np.concatenate(positions)
+            df = pandas.concat(frames, axis=1) if frames[1:] else frames[0]
+            if np.any(positions[1:] < positions[:-1]):
+                df = df.iloc[:, np.argsort(positions, kind='stable')]
+            df.columns = columns
+        else:
+            df = pandas.DataFrame(index=index, columns=columns)
+        if force_unicode and not isinstance(df.columns, pandas.RangeIndex):
+            df.columns = _map(_unicode, df.columns)
+        return df
+
     pandas_storables += [ \
         Storable(pandas.Series, \
             key='Python.pandas.core.series.Series', \
             handlers=StorableHandler(poke=poke_series, peek=peek_series)), \
         Storable(pandas.DataFrame, \
-            handlers=StorableHandler(poke=poke_dataframe, peek=peek_dataframe, \
-                peek_option='pandas.columns.force_unicode'))]
+            handlers=[ \
+                StorableHandler(poke=poke_dataframe, peek=peek_dataframe, \
+                    peek_option='pandas.columns.force_unicode'), \
+                StorableHandler(version=(2, ), \
+                    poke=poke_dataframe_blocks, peek=peek_dataframe_blocks, \
+                    peek_option='pandas.columns.force_unicode')])]
 
     pandas_aliases = [('Python.pandas.core.series.Series', 'Python.pandas.Series')]
 
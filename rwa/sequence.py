@@ -3,7 +3,7 @@
 Storable strategies for contiguous and optionally homogeneous arrays.
 """
 
-from .storable import StorableHandler, format_type
+from .storable import StorableHandler, format_type, to_version, from_version
 import rwa.generic as generic
 import traceback
 from collections import deque, Counter, OrderedDict, defaultdict
@@ -18,6 +18,34 @@ class SequenceHandling(object):
     def suitable_array_element(self, elem):
         return False
 
+    def suitable_columns(self, store, keys, values):
+        """
+        Whether the keys and values of a dictionnary should be written as two arrays,
+        instead of one record per entry.
+        """
+        return False
+
+    def suitable_struct_list(self, store, _list, visited):
+        """
+        Storable handler of the elements of a sequence of objects of the same type that
+        should be stored attribute-wise, or ``None``.
+
+        The handler should define :attr:`~rwa.storable.StorableHandler.peek_columns`.
+        """
+        return None
+
+    def homogeneous_type(self, _list):
+        """
+        Element type of a non-empty sequence of array elements of the same type,
+        or ``None`` if the sequence is not homogeneous.
+        """
+        _any = next(iter(_list)) # `set` does not support indexing
+        if self.suitable_array_element(_any):
+            _type = type(_any)
+            if all(type(x) is _type for x in _list): # _list[1:] does not work with `deque`
+                return _type
+        return None
+
     def to_record_name(self, name):
         return name
 
@@ -40,12 +68,8 @@ class SequenceHandling(object):
         if not _list:
             return self.new_container(store, name, _list, container)
         # check homogeneity
-        _any = next(iter(_list)) # `set` does not support indexing
-        if self.suitable_array_element(_any):
-            _type = type(_any)
-            homogeneous = all(type(x) is _type for x in _list) # _list[1:] does not work with `deque`
-        else:
-            homogeneous = False
+        _type = self.homogeneous_type(_list)
+        homogeneous = _type is not None
         if homogeneous:
             try:
                 record = self.poke_homogeneous_list(store, name, _type, _list,
@@ -55,10 +79,19 @@ class SequenceHandling(object):
             except:
                 #raise
                 homogeneous = False
-        if not homogeneous:
-            record = self.poke_heterogeneous_list(store, name, _list,
-                container, visited, _stack)
-        store.setRecordAttr('homogeneous', '1' if homogeneous else '0', record)
+        if homogeneous:
+            layout = '1'
+        else:
+            handler = self.suitable_struct_list(store, _list, visited)
+            if handler is None:
+                record = self.poke_heterogeneous_list(store, name, _list,
+                    container, visited, _stack)
+                layout = '0'
+            else:
+                record = self.poke_struct_list(store, name, handler, _list,
+                    container, visited, _stack)
+                layout = 'columns'
+        store.setRecordAttr('homogeneous', layout, record)
         return record
 
     def poke_list(self, exposes=()):
@@ -86,14 +119,27 @@ class SequenceHandling(object):
             store.poke(self.to_record_name(i), _item, sub_container, visited=visited, _stack=_stack)
         return sub_container
 
+    def poke_struct_list(self, store, name, handler, _list, container, visited, _stack):
+        # one sequence per exposed attribute, each stored as an array if possible
+        sub_container = self.new_container(store, name, _list, container)
+        for attr in handler.exposes:
+            column = [ getattr(obj, attr, None) for obj in _list ]
+            self.poke_list_items(store, attr, column, sub_container, visited, _stack)
+        store.setRecordAttr('element type', handler.storable_type, sub_container)
+        store.setRecordAttr('element version', from_version(handler.version), sub_container)
+        store.setRecordAttr('length', str(len(_list)), sub_container)
+        return sub_container
+
     def poke_array(self, store, name, elemtype, elements, container, visited, _stack):
         """abstract method"""
         raise NotImplementedError
 
     def peek_list_items(self, store, container, _stack):
-        homogeneous = store.getRecordAttr('homogeneous', container) == '1'
-        if homogeneous:
+        homogeneous = store.getRecordAttr('homogeneous', container)
+        if homogeneous == '1':
             return self.peek_homogeneous_list(store, container, _stack)
+        elif homogeneous == 'columns':
+            return self.peek_struct_list(store, container, _stack)
         else:
             return self.peek_heterogeneous_list(store, container, _stack)
 
@@ -127,6 +173,28 @@ class SequenceHandling(object):
             _list[i] = store.peek(record, container, _stack=_stack)
         return [ _list.get(i, None) for i in range(imax+1) ]
 
+    def peek_struct_list(self, store, container, _stack):
+        storable_type = store.getRecordAttr('element type', container)
+        version = store.getRecordAttr('element version', container)
+        try:
+            handler = store.byStorableType(storable_type).asVersion(version)
+        except KeyError:
+            handler = store.defaultStorable(storable_type=storable_type,
+                version=to_version(version))
+        n = int(store.getRecordAttr('length', container))
+        columns = {}
+        for attr in self.iter_records(store, container):
+            column = self.peek_list_items(store,
+                store.getRecord(store.formatRecordName(attr), container), _stack)
+            if len(column) < n:
+                # trailing `None` values are not stored
+                column += [None] * (n - len(column))
+            columns[attr] = column
+        peek_columns = handler.peek_columns
+        if peek_columns is None:
+            peek_columns = generic.default_peek_columns(handler.python_type, handler.exposes)
+        return peek_columns(columns, n)
+
     def peek_array(self, store, elemtype, container, _stack):
         """abstract method"""
         raise NotImplementedError
@@ -138,6 +206,10 @@ class SequenceHandling(object):
         # check homogeneity
         _keys = list(_dict.keys())
         first = _keys[0]
+        if keys_as_record_names is not False and \
+                self.suitable_columns(store, _keys, _dict.values()):
+            # columnar layout
+            keys_as_record_names = False
         if keys_as_record_names is not False and self.suitable_record_name(first):
             _type = type(first)
             keys_as_record_names = all(isinstance(x, _type) for x in _keys[1:])
@@ -230,7 +302,12 @@ class SequenceHandling(object):
             return StorableHandler(peek=self.peek_dict(factory, exposes=args),
                 poke=self.poke_dict(exposes=args, **kwargs))
         def _Counter(zipped):
-            return Counter(**dict(zipped))
+            return Counter(dict(zipped))
+        def _defaultdict(zipped):
+            # the default factory is restored as an exposed attribute
+            _dict = defaultdict()
+            _dict.update(zipped)
+            return _dict
         return OrderedDict((
             (tuple, list_handler(tuple)),
             (list,  list_handler(list)),
@@ -239,7 +316,7 @@ class SequenceHandling(object):
             (deque, list_handler(deque, 'maxlen')),
             (dict, dict_handler(dict)),
             (OrderedDict,   dict_handler(OrderedDict, keys_as_record_names=False)),
-            (defaultdict,   dict_handler(defaultdict, 'default_factory')),
+            (defaultdict,   dict_handler(_defaultdict, 'default_factory')),
             (Counter,       dict_handler(_Counter)),
         ))
 
@@ -6,6 +6,62 @@ class ConflictingVersionWarning(Warning):
 
 _undefined_parent_error = RuntimeError('corrupted handlers in Storable')
 
+
+class Params(dict):
+    """
+    Dictionnary of service-wide parameters that counts its modifications.
+
+    :attr:`version` changes every time the parameters are modified, so that values
+    derived from the parameters can be cached, e.g. by :class:`StorableHandler`.
+    Parameters should not be modified while a `poke` or `peek` call is in progress.
+    """
+    __slots__ = ('version',)
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.version = 0
+
+    def _modified(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._modified()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._modified()
+
+    def clear(self):
+        dict.clear(self)
+        self._modified()
+
+    def pop(self, key, *args):
+        if key in self:
+            self._modified()
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._modified()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._modified()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._modified()
+
+    def __ior__(self, other):
+        # Py3.9+
+        dict.update(self, other)
+        self._modified()
+        return self
+
+
 class StorableHandler(object):
     '''Defines how to store an object of the class identified by `_parent`.
 
@@ -29,6 +85,10 @@ class StorableHandler(object):
         _poke_option (set): keys of service-wide parameters to be passed to :attr:`_poke`.
             To be accessed through property :attr:`poke_option`.
 
+        peek_columns (callable): makes a list of objects from a dictionnary of attribute
+            values (one sequence per attribute), for sequences of objects stored
+            attribute-wise; ``None`` if not supported.
+
     :attr:`peek_option` and :attr:`poke_option` are keys in the service's :attr:`params` parameters
     which values are passed by :meth:`peek` and :meth:`poke` to :attr:`_peek` and :attr:`_poke`
     respectively, as keyword arguments if not already defined.
@@ -41,9 +101,14 @@ class StorableHandler(object):
     (where *params* is the service-wide :attr:`~StorableService.params` parameters)
     if *my_option* is not already passed from the caller's context
     and '*my_module.my_option*' is defined in *params*.
+
+    The keyword arguments are bound once and bound again only if the parameters are
+    modified, provided that *params* is a :class:`Params` object (e.g.
+    :data:`~rwa.generic.rwa_params`).
     '''
     __slots__ = ('version', 'exposes', '_poke', '_peek', '_parent', \
-            '_peek_option', '_poke_option')
+            '_peek_option', '_poke_option', 'peek_columns', \
+            '_peek_kwargs', '_poke_kwargs', '_bound')
 
     @property
     def peek_option(self):
@@ -56,6 +121,7 @@ class StorableHandler(object):
             self._peek_option = set(keys)
         else:
             self._peek_option = set([keys])
+        self._bound = None
 
     @property
     def poke_option(self):
@@ -68,6 +134,7 @@ class StorableHandler(object):
             self._poke_option = set(keys)
         else:
             self._poke_option = set([keys])
+        self._bound = None
 
     @property
     def python_type(self):
@@ -82,43 +149,46 @@ class StorableHandler(object):
         else:   return self._parent.storable_type
 
     def __init__(self, version=None, exposes={}, peek=None, poke=None, peek_option=None, \
-            poke_option=None):
+            poke_option=None, peek_columns=None):
         if version is None:
             version=(1,)
         self.version = version
         self.exposes = exposes
         self._parent = None
+        self._bound = None
         self._peek = peek
         self._poke = poke
         self.peek_option = peek_option
         self.poke_option = poke_option
+        self.peek_columns = peek_columns
+
+    def bindOptions(self):
+        """
+        Bind the :attr:`peek_option` and :attr:`poke_option` parameters, if not
+        already bound to the current parameters.
+        """
+        try:
+            params = self._parent.params
+        except AttributeError:
+            raise _undefined_parent_error
+        version = getattr(params, 'version', None)
+        if version is None or version != self._bound:
+            self._peek_kwargs = _bind_options(self._peek_option, params)
+            self._poke_kwargs = _bind_options(self._poke_option, params)
+            self._bound = version
 
     def peek(self, *args, **kwargs):
-        for option in self.peek_option:
-            try:
-                prm = self._parent.params[option]
-            except KeyError:
-                pass
-            except AttributeError:
-                raise _undefined_parent_error
-            else:
-                option = option.split('.')[-1]
-                if option not in kwargs:
-                    kwargs[option] = prm
+        if self._peek_option:
+            self.bindOptions()
+            if self._peek_kwargs:
+                kwargs = dict(self._peek_kwargs, **kwargs)
         return self._peek(*args, **kwargs)
 
     def poke(self, *args, **kwargs):
-        for option in self.poke_option:
-            try:
-                prm = self._parent.params[option]
-            except KeyError:
-                pass
-            except AttributeError:
-                raise _undefined_parent_error
-            else:
-                option = option.split('.')[-1]
-                if option not in kwargs:
-                    kwargs[option] = prm
+        if self._poke_option:
+            self.bindOptions()
+            if self._poke_kwargs:
+                kwargs = dict(self._poke_kwargs, **kwargs)
         self._poke(*args, **kwargs)
 
     def __str__(self):
@@ -128,6 +198,17 @@ class StorableHandler(object):
             return 'StorableHandler<storable_type={}, python_type={}, version={}, exposes={}>'.format(self.storable_type, self.python_type, self.version, self.exposes)
 
 
+def _bind_options(options, params):
+    kwargs = {}
+    for option in options:
+        try:
+            prm = params[option]
+        except KeyError:
+            pass
+        else:
+            kwargs[option.split('.')[-1]] = prm
+    return kwargs
+
 
 class Storable(object):
     '''Describes a storable class.
@@ -244,6 +325,22 @@ def format_type(python_type, agnostic=False, deprivatize=False):
     return storable_type
 
 
+def has_instance_state(obj):
+    '''
+    Tell whether an object has attributes of its own, in its `__dict__` or slots.
+    '''
+    if getattr(obj, '__dict__', None):
+        return True
+    for cls in type(obj).__mro__:
+        slots = cls.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots, )
+        for slot in slots:
+            if slot not in ('__dict__', '__weakref__') and hasattr(obj, slot):
+                return True
+    return False
+
+
 class StorableService(object):
     '''Service for storable instances.
 
@@ -257,13 +354,26 @@ class StorableService(object):
         params (dict): mutable map of global parameters shared with all the registered
             storable instances.
 
+        _plans (dict): cached handlers, with Python types or (storable type, version)
+            pairs as keys; see :meth:`pokePlan` and :meth:`peekPlan`.
+
+        _plans_version (int): version of :attr:`params` when the cached handlers
+            were resolved.
+
+        _lazy (dict): functions that register storable instances on demand, with
+            top-level module names as keys; see :meth:`registerLazy`.
+
     '''
-    __slots__ = ('by_python_type', 'by_storable_type', 'params') # what about native_type?
+    __slots__ = ('by_python_type', 'by_storable_type', 'params', '_plans', '_plans_version',
+            '_lazy') # what about native_type?
 
     def __init__(self, params={}):
         self.by_python_type = {}
         self.by_storable_type = {}
         self.params = params
+        self._plans = {}
+        self._plans_version = None
+        self._lazy = {}
 
     def registerStorable(self, storable, replace=False, agnostic=False, deprivatize=None):
         # check for compliance and fill in missing fields if possible
@@ -305,6 +415,7 @@ class StorableService(object):
         if pokes:
             self.by_python_type[storable.python_type] = existing
         self.by_storable_type[storable.storable_type] = existing
+        self.clearPlans()
 
     def registerAlias(self, existing_key, alias):
         if existing_key in self.by_storable_type.keys():
@@ -312,14 +423,191 @@ class StorableService(object):
                 raise KeyError('storable type already registered', alias)
             else:
                 self.by_storable_type[alias] = self.by_storable_type[existing_key]
+                self.clearPlans()
         else:
             raise KeyError('storable type not found', existing_key)
 
+    def registerLazy(self, modules, register):
+        '''
+        Defers the registration of the storable instances for the types of some modules.
+
+        `register` is called once, with the service as argument, the first time a type
+        defined in one of these modules (or a subclass of such a type) is looked up,
+        or a storable type named after one of these modules.
+
+        Arguments:
+
+            modules (str or list): top-level module names, e.g. ``'pandas'``.
+
+            register (callable): function that registers the storable instances.
+        '''
+        if isinstance(modules, str):
+            modules = [modules]
+        for module in modules:
+            self._lazy[module] = register
+
+    def loadLazy(self, module):
+        '''
+        Registers the storable instances deferred for a module, if any.
+
+        Arguments:
+
+            module (str): module name, e.g. ``'pandas.core.frame'``.
+
+        Returns:
+
+            bool: ``True`` if storable instances were registered.
+        '''
+        register = self._lazy.pop(module.split('.', 1)[0], None)
+        if register is None:
+            return False
+        for other in [ m for m, r in self._lazy.items() if r is register ]:
+            del self._lazy[other]
+        register(self)
+        return True
+
+    def _loadLazyPythonType(self, python_type):
+        loaded = False
+        for base in getattr(python_type, '__mro__', (python_type, )):
+            module = getattr(base, '__module__', None)
+            if module and self.loadLazy(module):
+                loaded = True
+        return loaded
+
+    def _loadLazyStorableType(self, storable_type):
+        if not isinstance(storable_type, str):
+            return False
+        if storable_type.startswith('Python.'):
+            storable_type = storable_type[7:]
+        return self.loadLazy(storable_type)
+
+    def clearPlans(self):
+        '''
+        Invalidates the cached handlers.
+
+        To be called whenever registered storable instances are modified in place.
+        '''
+        self._plans.clear()
+
+    def pokePlan(self, obj):
+        '''
+        Handler to serialize an object with.
+
+        If the type of `obj` is not registered, the storable instance of a base class
+        may be selected instead (see :meth:`byBaseType`), unless `obj` has attributes
+        of its own (see :func:`has_instance_state`), in which case a warning is emitted
+        and ``None`` is returned.
+
+        The result is cached per type, except for unregistered types.
+        For storable instances which default version is defined dynamically
+        (see :attr:`Storable.default_version`), the result is cached until :attr:`params`
+        is modified, if :attr:`params` is a :class:`Params` dictionnary, and is not
+        cached otherwise.
+
+        Only the resolution of the handler is cached. The attributes that the handler
+        exposes are still serialized one at a time through :meth:`~StoreBase.poke`,
+        so that the store-specific behaviors (e.g. links to already serialized objects,
+        small objects, call stack and statistics) apply to each of them.
+
+        Arguments:
+
+            obj (any): object to be serialized.
+
+        Returns:
+
+            StorableHandler: handler of the default version, or ``None`` if neither the type
+                of `obj` nor a suitable base class are registered.
+        '''
+        _type = type(obj)
+        params_version = getattr(self.params, 'version', None)
+        if params_version != self._plans_version:
+            self._plans.clear()
+            self._plans_version = params_version
+        try:
+            return self._plans[_type]
+        except KeyError:
+            pass
+        storable = self.byPythonType(obj)
+        by_base = storable is None
+        if by_base:
+            storable = self.byBaseType(_type)
+            if storable is not None and has_instance_state(obj):
+                # the attributes would be lost; auto-serialize instead
+                warn("{} object with attributes: the content of the base type '{}' is not serialized".format(
+                    _type, storable.storable_type))
+                storable = None
+        handler = None if storable is None else storable.asVersion()
+        if _type is getattr(obj, '__class__', None) and not by_base and \
+                (storable is None or params_version is not None or \
+                type(storable).default_version is Storable.default_version):
+            self._plans[_type] = handler
+        return handler
+
+    def byBaseType(self, python_type):
+        '''
+        Storable instance of the nearest registered base class of a type, if this storable
+        instance serializes objects as a whole, i.e. with no exposed attributes.
+
+        Objects serialized this way are deserialized as objects of the base class.
+        :meth:`pokePlan` does not resolve objects with attributes of their own this way.
+        Subclasses of classes with exposed attributes are not resolved, and neither are
+        named tuples, so that they are auto-serialized instead.
+
+        Arguments:
+
+            python_type (type): unregistered type.
+
+        Returns:
+
+            Storable: storable instance, or ``None``.
+        '''
+        if hasattr(python_type, '_fields'): # named tuple
+            return None
+        for base in getattr(python_type, '__mro__', ())[1:]:
+            if base is object:
+                break
+            storable = self.by_python_type.get(base, None)
+            if storable is not None:
+                if any( h.exposes for h in storable.handlers ):
+                    return None
+                return storable
+        return None
+
+    def peekPlan(self, storable_type, version):
+        '''
+        Handler to deserialize a record with, given its storable type and version.
+
+        The result is cached, except if the version is not defined and the default version
+        is defined dynamically, in which case the same rules as in :meth:`pokePlan` apply.
+        As with :meth:`pokePlan`, the children records are resolved one at a time.
+
+        Raises:
+
+            KeyError: if the storable type or the version is not registered.
+        '''
+        key = (storable_type, version)
+        params_version = getattr(self.params, 'version', None)
+        if params_version != self._plans_version:
+            self._plans.clear()
+            self._plans_version = params_version
+        try:
+            return self._plans[key]
+        except KeyError:
+            pass
+        storable = self.byStorableType(storable_type)
+        handler = storable.asVersion(version)
+        if version is not None or params_version is not None or \
+                type(storable).default_version is Storable.default_version:
+            self._plans[key] = handler
+        return handler
+
     def byPythonType(self, t, istype=False):
         if istype:#isinstance(t, type):
             try:
                 return self.by_python_type[t]
             except KeyError:
+                if self._lazy and self._loadLazyPythonType(t):
+                    return self.byPythonType(t, istype)
                 return None
         else:
             #raise TypeError
@@ -329,25 +617,41 @@ class StorableService(object):
                 try:
                     return self.by_python_type[t.__class__]
                 except (AttributeError, KeyError):
+                    if self._lazy and self._loadLazyPythonType(type(t)):
+                        return self.byPythonType(t, istype)
                     return None
 
     def hasPythonType(self, t, istype=False):
         if istype:#isinstance(t, type):
-            return t in self.by_python_type
+            if t in self.by_python_type:
+                return True
+            return bool(self._lazy) and self._loadLazyPythonType(t) and \
+                t in self.by_python_type
         else:
             if type(t) in self.by_python_type:
                 return True
             else:
                 try:
-                    return t.__class__ in self.by_python_type
+                    if t.__class__ in self.by_python_type:
+                        return True
                 except AttributeError:
                     return False
+                return bool(self._lazy) and self._loadLazyPythonType(type(t)) and \
+                    self.hasPythonType(t, istype)
 
     def byStorableType(self, t):
-        return self.by_storable_type[t]
+        try:
+            return self.by_storable_type[t]
+        except KeyError:
+            if self._lazy and self._loadLazyStorableType(t):
+                return self.by_storable_type[t]
+            raise
 
     def hasStorableType(self, t):
-        return t in self.by_storable_type
+        if t in self.by_storable_type:
+            return True
+        return bool(self._lazy) and self._loadLazyStorableType(t) and \
+            t in self.by_storable_type
 
 
 
@@ -388,6 +692,12 @@ class StoreBase(StorableService):
     def registerStorable(self, storable, **kwargs):
         self.storables.registerStorable(storable, **kwargs)
 
+    def pokePlan(self, obj):
+        return self.storables.pokePlan(obj)
+
+    def peekPlan(self, storable_type, version):
+        return self.storables.peekPlan(storable_type, version)
+
     def peek(self, objname, container, _stack=None):
         '''Reads from a container.
 
@@ -484,12 +794,15 @@ class CallStack(object):
     pointer, call the :meth:`add` method (that actually returns the pointer) and then set the
     pointer back to its original value before each child :meth:`~StoreBase.peek` or
     :meth:`~StoreBase.poke` call.
+
+    The stack is truncated in place, and the human-readable path is rendered only
+    by :meth:`exception`.
     """
     __slots__ = ('stack',)
     def __init__(self):
         self.stack = []
     def add(self, record):
-        ptr = self.pointer
+        ptr = len(self.stack)
         self.stack.append(record)
         return ptr
     @property
@@ -497,9 +810,9 @@ class CallStack(object):
         return len(self.stack)
     @pointer.setter
     def pointer(self, ptr):
-        if not isinstance(ptr, int) or ptr < 0 or len(self.stack) < ptr:
+        if ptr < 0 or len(self.stack) < ptr:
             raise ValueError('wrong pointer')
-        self.stack = self.stack[:ptr]
+        del self.stack[ptr:]
     def __repr__(self):
         return 'CallStack'+str(self.stack)
     def __str__(self):
@@ -521,7 +834,12 @@ class CallStack(object):
         else:
             return type(exc)(str(self))
     def clear(self):
-        self.stack = []
+        del self.stack[:]
+    def __copy__(self):
+        # the stack is truncated in place, hence it is not shared
+        other = type(self)()
+        other.stack = list(self.stack)
+        return other
     def __nonzero__(self):
         return bool(self.stack)
     def __len__(self):
@@ -530,8 +848,8 @@ class CallStack(object):
         return self.stack[i]
     def __setitem__(self, i, record):
         self.stack[i] = record
-    def __delitem__(self, record):
-        self.stack.delete(record)
+    def __delitem__(self, i):
+        del self.stack[i]
     def __reversed__(self):
         return reversed(self.stack)
     def __contains__(self, record):
@@ -542,9 +860,29 @@ class CallStack(object):
         return self.stack.pop()
 
 
+class NoCallStack(CallStack):
+    """
+    Call stack that records nothing.
+
+    Used instead of :class:`CallStack` with ``rwa_params['call_stack'] = False``,
+    at the cost of error messages that do not report the path of the faulty record.
+    """
+    __slots__ = ()
+    def add(self, record):
+        return 0
+    @property
+    def pointer(self):
+        return 0
+    @pointer.setter
+    def pointer(self, ptr):
+        pass
+    def exception(self, exc):
+        return exc
+
+
 def copy_handler(handler):
     return StorableHandler(handler.version, handler.exposes, handler._peek, handler._poke, \
-            handler.peek_option, handler.poke_option)
+            handler.peek_option, handler.poke_option, handler.peek_columns)
 
 def copy_storable(storable, constructor=None):
     if constructor is None:
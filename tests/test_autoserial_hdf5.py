@@ -4,11 +4,20 @@ Test serialization of custom class objects and Python-3 autoserialization featur
 """
 
 from rwa.generic import *
-from rwa.hdf5 import HDF5Store, hdf5_storable
+from rwa.hdf5 import HDF5Store, hdf5_storable, hdf5_service
+import rwa.generic as generic
 
 import os.path
+import sys
 import six
-from collections import OrderedDict
+import warnings
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+
+class Class4(object):
+    # module-level type, for :func:`~rwa.generic.lookup_type`
+    __slots__ = ('attr1', 'attr2')
 
 
 class TestSerialization(object):
@@ -86,3 +95,173 @@ class TestSerialization(object):
         finally:
             store.close()
 
+
+    def test_plans(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test type
+        class Class3(object):
+            __slots__ = ('attr1', 'attr2')
+        hdf5_storable(default_storable(Class3, exposes=('attr1', )))
+        # test values
+        obj = Class3()
+        obj.attr1, obj.attr2 = 1, 2
+        # write with the cached handler, and again after registering a new version
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('v1', obj)
+            hdf5_storable(default_storable(Class3, version=(2, ),
+                exposes=('attr1', 'attr2')))
+            store.poke('v2', obj)
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert not hasattr(store.peek('v1'), 'attr2')
+            assert store.peek('v2').attr2 == 2
+        finally:
+            store.close()
+
+
+    def test_subclasses(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test types
+        class Dict(dict):
+            __slots__ = ()
+        class List(list):
+            pass
+        class Array(np.ndarray):
+            pass
+        Pair = namedtuple('Pair', ('first', 'second'))
+        class Parent(object):
+            __slots__ = ('attr1', )
+        class Child(Parent):
+            __slots__ = ('attr2', )
+        hdf5_storable(default_storable(Parent))
+        child = Child()
+        child.attr1, child.attr2 = 1, 2
+        # test values
+        data = {'dict': Dict(a=1, b=[2]), 'list': List([1, 'a']),
+            'array': np.arange(4).view(Array), 'pair': Pair(1, 'a'), 'child': child}
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            for t in data:
+                store.poke(t, data[t])
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert type(store.peek('dict')) is dict
+            assert store.peek('dict') == data['dict']
+            assert type(store.peek('list')) is list
+            assert store.peek('list') == data['list']
+            assert type(store.peek('array')) is np.ndarray
+            assert np.all(store.peek('array') == data['array'])
+            assert store.peek('pair') == data['pair']
+            assert type(store.peek('pair')) is Pair
+            obj = store.peek('child')
+            assert type(obj) is Child
+            assert (obj.attr1, obj.attr2) == (1, 2)
+        finally:
+            store.close()
+        # subclasses with attributes are auto-serialized, with a warning
+        tagged = List([1, 2])
+        tagged.name = 'tagged'
+        store = HDF5Store(test_file, 'w')
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                store.poke('tagged', tagged)
+            assert caught
+        finally:
+            store.close()
+        store = HDF5Store(test_file, 'r')
+        try:
+            obj = store.peek('tagged')
+            assert type(obj) is List
+            assert obj.name == 'tagged'
+        finally:
+            store.close()
+
+
+    def test_schemas(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        assert sorted(warm_schemas([Class4])[Class4]) == ['attr1', 'attr2']
+        # test values
+        obj = Class4()
+        obj.attr1, obj.attr2 = 1, 'a'
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('obj', obj)
+        finally:
+            store.close()
+        # read with no storable instance and no introspection
+        storable_type = format_type(Class4)
+        del hdf5_service.by_python_type[Class4]
+        del hdf5_service.by_storable_type[storable_type]
+        hdf5_service.clearPlans()
+        auto_exposes.cache_clear()
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert sorted(store.schemaTable()[(storable_type, (1, ))]) == ['attr1', 'attr2']
+            val = store.peek('obj')
+        finally:
+            store.close()
+        assert (val.attr1, val.attr2) == (1, 'a')
+        assert Class4 not in generic._schemas
+
+
+    def test_options(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test type, with an option passed to its `peek` routine
+        class Class5(object):
+            __slots__ = ('attr1', )
+        handler = default_storable(Class5).asVersion()
+        default_peek = handler._peek
+        def peek(store, container, _stack=None, scale=1):
+            obj = default_peek(store, container, _stack=_stack)
+            obj.attr1 *= scale
+            return obj
+        hdf5_storable(Storable(Class5, handlers=StorableHandler(exposes=handler.exposes,
+            peek=peek, poke=handler._poke, peek_option='test.scale')))
+        obj = Class5()
+        obj.attr1 = 2
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('obj', obj)
+        finally:
+            store.close()
+        # read, with options bound again after `rwa_params` is modified
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert store.peek('obj').attr1 == 2
+            rwa_params['test.scale'] = 3
+            try:
+                assert store.peek('obj').attr1 == 6
+                assert store.peek('obj', scale=4).attr1 == 8
+            finally:
+                del rwa_params['test.scale']
+            assert store.peek('obj').attr1 == 2
+            # in-place union
+            if sys.version_info >= (3, 9):
+                params = rwa_params # local name, as `|=` rebinds it
+                params |= {'test.scale': 5}
+                try:
+                    assert store.peek('obj').attr1 == 10
+                finally:
+                    del rwa_params['test.scale']
+            # no-op calls do not invalidate the cached values
+            version = rwa_params.version
+            rwa_params.pop('test.scale', None)
+            rwa_params.setdefault('test.scale', 6)
+            assert rwa_params.version == version + 1
+            rwa_params.setdefault('test.scale', 7)
+            assert rwa_params.version == version + 1
+            assert rwa_params.pop('test.scale') == 6
+            assert rwa_params.version == version + 2
+        finally:
+            store.close()
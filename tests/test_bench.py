@@ -0,0 +1,22 @@
+
+"""
+Smoke test of the benchmark suite.
+"""
+
+from rwa.bench import run, compare, format_table, workloads
+
+
+class TestBench(object):
+
+    def test_run(self, tmpdir):
+        results = run(list(workloads), scale=.01, repeat=1, tmpdir=tmpdir.strpath)
+        assert list(results) == list(workloads)
+        for measures in results.values():
+            assert 0 < measures['records'] and 0 < measures['file_bytes']
+        assert not tmpdir.listdir()
+        # compare with a faster baseline
+        baseline = { name: dict(measures, write_s=measures['write_s'] / 2)
+            for name, measures in results.items() }
+        regressions = compare(results, baseline)
+        assert sorted(regressions) == sorted( (name, 'write_s', 2.) for name in workloads )
+        assert format_table(results, baseline).startswith('workload')
@@ -9,7 +9,8 @@ from rwa.hdf5 import HDF5Store
 
 import os.path
 import numpy as np
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+import datetime
 
 
 class TestNativeTypes(object):
@@ -127,3 +128,32 @@ class TestNativeTypes(object):
         finally:
             store.close()
 
+    def test_types(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        factory = defaultdict(list)
+        factory['a'].append(1)
+        data = {'types': [int, float, OrderedDict, datetime.datetime],
+            'factory': factory}
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            for t in data:
+                store.poke(t, data[t])
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert store.peek('types') == data['types']
+            factory = store.peek('factory')
+            assert factory.default_factory is list
+            assert factory == data['factory']
+        finally:
+            store.close()
+        # names are resolved without `eval`
+        assert lookup_type('Python.__import__') is None
+        assert lookup_type('Python.os.system') is None
+        assert lookup_type('os.path') is None
+        assert lookup_type('Python.collections.OrderedDict') is OrderedDict
+        assert lookup_type(b'Python.int') is int
@@ -0,0 +1,1019 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test the HDF5 storage layer: dataset layout, filters and partial I/O.
+"""
+
+from rwa.generic import *
+from rwa.hdf5 import HDF5Store, StoragePolicy, ArrayProxy, hdf5_storable
+from rwa.lazy import islazy
+import rwa.hdf5
+
+from collections import OrderedDict, Counter, defaultdict, namedtuple
+import os.path
+import sys
+import subprocess
+import json
+import numpy as np
+import h5py
+from scipy import sparse
+from pandas import DataFrame, Series
+
+
+class TestStoragePolicy(object):
+
+    def test_global_policy(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        data = {'large': np.random.rand(1000, 10),
+            'small': np.arange(10),
+            'list': list(range(1000)),
+            }
+        # write
+        rwa_params['hdf5.storage'] = StoragePolicy(compression='gzip', shuffle=True,
+            chunks=8000, min_size=1000)
+        store = HDF5Store(test_file, 'w')
+        try:
+            for t in data:
+                store.poke(t, data[t])
+        finally:
+            store.close()
+            del rwa_params['hdf5.storage']
+        # check the layout
+        with h5py.File(test_file, 'r') as f:
+            assert f['large'].compression == 'gzip'
+            assert f['large'].shuffle
+            assert f['large'].chunks == (100, 10)
+            assert f['small'].compression is None
+            assert f['small'].chunks is None
+            assert f['list'].compression == 'gzip'
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert np.all(store.peek('large') == data['large'])
+            assert np.all(store.peek('small') == data['small'])
+            assert store.peek('list') == data['list']
+        finally:
+            store.close()
+
+    def test_per_type_policy(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        df = DataFrame({'a': np.arange(100), 'b': np.random.rand(100)})
+        mat = sparse.random(100, 100, density=.1, format='csr')
+        array = np.random.rand(100)
+        policy = {None: None,
+            DataFrame: StoragePolicy(compression='lzf'),
+            sparse.csr_matrix: StoragePolicy(compression='gzip', fletcher32=True),
+            }
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('df', df, storage=policy)
+            store.poke('mat', mat, storage=policy)
+            store.poke('array', array, storage=policy)
+            store.poke('default', array)
+        finally:
+            store.close()
+        # check the layout
+        with h5py.File(test_file, 'r') as f:
+            for block in f['df/blocks'].values():
+                assert block.compression == 'lzf'
+            assert f['mat/data'].compression == 'gzip'
+            assert f['mat/data'].fletcher32
+            assert f['mat/indices'].compression == 'gzip'
+            assert f['array'].compression is None
+            assert f['default'].compression is None
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert np.all(store.peek('df').values == df.values)
+            assert np.all(store.peek('mat').todense() == mat.todense())
+        finally:
+            store.close()
+
+
+class TestExtendableRecords(object):
+
+    def test_append(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        frames = np.random.rand(5, 4, 3)
+        # write in place, in several sessions
+        for session in range(2):
+            store = HDF5Store(test_file, 'a')
+            try:
+                if session == 0:
+                    store.append('frames', frames[:2])
+                    store.append('counts', [1, 2])
+                else:
+                    store.append('counts', (3,))
+                for frame in frames[2*session+2:2*session+4]:
+                    store.append('frames', frame)
+            finally:
+                store.close()
+        with h5py.File(test_file, 'r') as f:
+            assert f['frames'].maxshape == (None, 4, 3)
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert np.array_equal(store.peek('frames'), frames)
+            assert store.peek('counts') == [1, 2, 3]
+        finally:
+            store.close()
+
+    def test_append_errors(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('fixed', np.arange(3))
+            store.append('rows', np.zeros((2, 3)))
+            store.append('counts', np.arange(2, dtype=np.int32))
+            for name, rows, error in (('fixed', [3], TypeError),
+                    ('rows', np.zeros((2, 2)), ValueError),
+                    ('strings', ['a', 'b'], TypeError),
+                    ('counts', np.array([2.5]), ValueError),
+                    ('counts', [1 << 40], ValueError)):
+                try:
+                    store.append(name, rows)
+                except error:
+                    pass
+                else:
+                    assert False
+            # conversions with no loss
+            store.append('rows', np.full((1, 3), .5, dtype=np.float32))
+            store.append('counts', [2, 3.])
+        finally:
+            store.close()
+
+    def test_stream_errors(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        def blocks():
+            yield DataFrame({'a': np.arange(4)})
+            yield DataFrame({'b': np.arange(4)})
+        for name, stream, error in (('dataframe', blocks(), ValueError),
+                ('scalars', iter([1, 2, 2.5]), ValueError)):
+            store = HDF5Store(test_file, 'w')
+            try:
+                store.pokeStream(name, stream, buffer_size=2)
+            except error:
+                pass
+            else:
+                assert False
+            finally:
+                store.close()
+            # the partial record is not written
+            assert not os.path.exists(test_file)
+
+    def test_stream(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        def arrays():
+            for i in range(4):
+                yield np.full((i, 2), i)
+        def scalars():
+            for i in range(10):
+                yield i * .5
+        def blocks():
+            for i in range(3):
+                yield DataFrame({'a': np.arange(i, i+4), 'b': np.random.rand(4)})
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.pokeStream('arrays', arrays(), dtype=np.float32)
+            store.pokeStream('scalars', scalars(), buffer_size=3)
+            store.pokeStream('empty', iter(()), dtype=int)
+            ref = list(blocks())
+            store.pokeStream('dataframe', iter(ref))
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('arrays')
+            assert val.dtype == np.float32
+            assert np.array_equal(val, np.concatenate(list(arrays())))
+            assert np.array_equal(store.peek('scalars'), np.fromiter(scalars(), float))
+            assert store.peek('empty').shape == (0, )
+            df = store.peek('dataframe')
+            assert df.columns.tolist() == ['a', 'b']
+            assert np.array_equal(df.index, np.arange(12))
+            assert np.array_equal(df.values, np.concatenate([ b.values for b in ref ]))
+        finally:
+            store.close()
+
+
+class TestPartialRead(object):
+
+    def test_array_proxy(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        data = {'array': np.arange(120).reshape((6, 5, 4)), 'scalar': 1.5,
+            'df': DataFrame({'a': np.arange(4), 'b': np.random.rand(4)}),
+            'series': Series(np.random.rand(4)),
+            'mat': sparse.random(10, 10, density=.1, format='csr')}
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('data', lazy='array')
+            assert val['scalar'] == data['scalar']
+            array, ref = val['array'], data['array']
+            assert isinstance(array, ArrayProxy)
+            assert array.shape == ref.shape
+            assert array.dtype == ref.dtype
+            for key in (1, slice(None, None, -2), (Ellipsis, 2), ([4, 0, 4], 1),
+                    (slice(None), [3, 1], [0, 2]), (None, -1), ref[:,0,0] % 2 == 0):
+                assert np.array_equal(array[key], ref[key])
+            for key in (np.ones(5, dtype=bool), (slice(None), np.ones(6, dtype=bool))):
+                try:
+                    array[key]
+                except IndexError:
+                    pass
+                else:
+                    assert False
+            assert np.array_equal(np.asarray(array), ref)
+            # arrays in other types than plain containers are loaded
+            assert val['df'].equals(data['df'])
+            assert val['series'].equals(data['series'])
+            assert np.array_equal(val['mat'].toarray(), data['mat'].toarray())
+            # default mode
+            assert isinstance(store.peek('data')['array'], np.ndarray)
+        finally:
+            store.close()
+
+    def test_memory_map(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        data = {'contiguous': np.random.rand(100, 3), 'empty': np.zeros((0, 3))}
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', data)
+            store.poke('compressed', data['contiguous'],
+                storage=StoragePolicy(compression='gzip'))
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('data', lazy='memmap')
+            assert isinstance(val['contiguous'], np.memmap)
+            assert not val['contiguous'].flags.writeable
+            assert np.array_equal(val['contiguous'], data['contiguous'])
+            assert val['empty'].shape == data['empty'].shape
+            # fallback
+            val = store.peek('compressed', lazy='memmap')
+            assert not isinstance(val, np.memmap)
+            assert np.array_equal(val, data['contiguous'])
+        finally:
+            store.close()
+
+
+class TestTypeTable(object):
+
+    def test_type_table(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        data = {'frames': [DataFrame({'a': np.arange(3)}) for _ in range(3)],
+            'mat': sparse.random(10, 10, density=.1, format='csr'),
+            }
+        # write in the legacy format, then append in table mode
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('legacy', data['mat'])
+        finally:
+            store.close()
+        rwa_params['hdf5.type_table'] = True
+        store = HDF5Store(test_file, 'a')
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+            del rwa_params['hdf5.type_table']
+        # check the layout
+        with h5py.File(test_file, 'r') as f:
+            assert 'type' in f['legacy'].attrs
+            assert 'type' not in f['data'].attrs
+            assert 'type code' in f['data'].attrs
+            types = [ t for t, _ in f.attrs['storable types'] ]
+            assert len(types) == len(set(types))
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert np.all(store.peek('legacy').todense() == data['mat'].todense())
+            val = store.peek('data')
+            assert len(val['frames']) == 3
+            for df in val['frames']:
+                assert np.array_equal(df['a'].values, np.arange(3))
+            assert np.all(val['mat'].todense() == data['mat'].todense())
+        finally:
+            store.close()
+
+
+class Config(object):
+    pass
+
+
+class TestRecordAttrs(object):
+
+    def write(self, test_file):
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', {'a': [1, 2], 'b': [1, 'x'], 'c': (1., )})
+        finally:
+            store.close()
+
+    def test_cached_reads(self, tmpdir, monkeypatch):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        self.write(test_file)
+        # count the reads per record
+        reads = Counter()
+        read = HDF5Store._readRecordAttrs
+        def counted_read(store, record):
+            reads[record.name] += 1
+            return read(store, record)
+        monkeypatch.setattr(HDF5Store, '_readRecordAttrs', counted_read)
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert store.peek('data') == {'a': [1, 2], 'b': [1, 'x'], 'c': (1., )}
+        finally:
+            store.close()
+        # 'type', 'version', 'homogeneous' and 'element type' are read in a single pass
+        assert reads['/data/items/a'] == 1
+        assert reads['/data/items/b'] == 1
+        assert all( n == 1 for n in reads.values() )
+
+    def test_invalidation(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        self.write(test_file)
+        store = HDF5Store(test_file, 'a')
+        try:
+            # cache the attributes, as in a peek call
+            store._attrs = OrderedDict()
+            record = store.store['data/items/a']
+            assert store.getRecordAttr('homogeneous', record) == '1'
+            assert store.getRecordType(record) == ('Python.list', '3')
+            store.setRecordAttr('homogeneous', '0', record)
+            assert store.getRecordAttr('homogeneous', record) == '0'
+            store.setRecordType('Python.tuple', '2', record)
+            assert store.getRecordType(record) == ('Python.tuple', '2')
+        finally:
+            store._attrs = None
+            store.close()
+
+    def test_cache_size(self, tmpdir, monkeypatch):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        self.write(test_file)
+        monkeypatch.setattr(rwa.hdf5, 'attr_cache_size', 2)
+        store = HDF5Store(test_file, 'r')
+        try:
+            store._attrs = OrderedDict()
+            a, b, c = ( store.store['data/items/' + name] for name in 'abc' )
+            for record in (a, b, a, c):
+                store.getRecordAttrs(record)
+            # `b` is the least recently used record
+            assert [ record for record, _ in store._attrs.values() ] == [a, c]
+        finally:
+            store._attrs = None
+            store.close()
+
+
+class TestSmallObjects(object):
+
+    def test_small_objects(self, tmpdir):
+        # test values
+        config = Config()
+        config.__dict__.update({'flag': True, 'count': 3, 'ratio': .5,
+            'z': 1j, 'name': u'caf\xe9', 'raw': b'abc', 'padded': b'a\0',
+            'items': [1, 'a', 2.5], 'options': {'b': 2, 'a': 'x'}})
+        for mode in ('attrs', 'compact'):
+            test_file = os.path.join(tmpdir.strpath, mode + '.h5')
+            # write
+            rwa_params['hdf5.small_objects'] = mode
+            store = HDF5Store(test_file, 'w')
+            try:
+                store.poke('config', config)
+                store.poke('count', 1)
+                store.poke('type', int)
+                store.poke('text', u'caf\xe9')
+            finally:
+                store.close()
+                del rwa_params['hdf5.small_objects']
+            # check the layout
+            with h5py.File(test_file, 'r') as f:
+                assert 'count' in f
+                group = f['config']
+                if mode == 'attrs':
+                    assert 'value:ratio' in group.attrs
+                    assert 'ratio' not in group
+                    assert 'padded' in group
+                    assert 'value:0' in group['items'].attrs
+                else:
+                    assert group['ratio'].id.get_create_plist().get_layout() \
+                        == h5py.h5d.COMPACT
+            # read and check
+            store = HDF5Store(test_file, 'r')
+            try:
+                val = store.peek('config')
+                assert val.__dict__ == config.__dict__
+                for attr in ('flag', 'raw', 'name'):
+                    assert type(getattr(val, attr)) is type(getattr(config, attr))
+                assert store.peek('count') == 1
+                assert store.peek('type') is int
+                assert store.peek('text') == u'caf\xe9'
+            finally:
+                store.close()
+
+
+class TestStringArrays(object):
+
+    def test_string_arrays(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        data = {'labels': [ 'label{}'.format(i) for i in range(100) ],
+            'unicode': (u'caf\xe9', u'', u'日本'),
+            'varying': [ 'a' * 100, 'b' ] * 10,
+            'bytes': {b'a', b'bc'},
+            'frozen': frozenset([u'x', u'yz']),
+            'nul': [b'a\0', b'b'],
+            'mixed': ['a', b'b'],
+            }
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+        # check the layout
+        with h5py.File(test_file, 'r') as f:
+            group = f['data/items']
+            assert group['labels'].dtype.kind == 'S'
+            assert h5py.check_dtype(vlen=group['varying'].dtype) is not None
+            for name in ('unicode', 'bytes', 'frozen'):
+                assert isinstance(group[name], h5py.Dataset)
+            for name in ('nul', 'mixed'):
+                assert isinstance(group[name], h5py.Group)
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            assert store.peek('data') == data
+        finally:
+            store.close()
+
+
+class TestColumnarDicts(object):
+
+    def test_columnar_dicts(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        n = 1000
+        data = {'ints': { i: float(i) for i in range(n) },
+            'labels': OrderedDict( ('label{}'.format(i), i) for i in range(n) ),
+            'counts': Counter({ i: i % 7 for i in range(n) }),
+            'flags': defaultdict(bool, { u'caf\xe9{}'.format(i): i % 2 == 0 for i in range(n) }),
+            'small': {1: 2., 3: 4.},
+            'mixed': { i: [i] for i in range(n) },
+            }
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            for name in data:
+                store.poke(name, data[name])
+        finally:
+            store.close()
+        # check the layout
+        with h5py.File(test_file, 'r') as f:
+            for name in ('ints', 'labels', 'counts', 'flags'):
+                assert isinstance(f[name]['keys'], h5py.Dataset)
+                assert isinstance(f[name]['values'], h5py.Dataset)
+            assert 'items' in f['small']
+            assert 'items' in f['mixed']
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            for name in data:
+                val = store.peek(name)
+                assert type(val) is type(data[name])
+                assert val == data[name]
+                key, value = next(iter(val.items()))
+                assert type(key) is type(next(iter(data[name])))
+                assert type(value) is type(data[name][key])
+            assert list(store.peek('labels')) == list(data['labels'])
+        finally:
+            store.close()
+
+
+class Point(object):
+    __slots__ = ('x', 'y', 'label', 'extra')
+    def __eq__(self, other):
+        return type(other) is type(self) and all( getattr(self, attr, None) == \
+            getattr(other, attr, None) for attr in self.__slots__ )
+
+Pair = namedtuple('Pair', ('first', 'second'))
+
+
+class TestStructLists(object):
+
+    def test_struct_lists(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        hdf5_storable(namedtuple_storable(Pair))
+        # test values
+        n = 200
+        points = []
+        for i in range(n):
+            point = Point()
+            point.x, point.y, point.label = i, float(i) / 2, 'p{}'.format(i)
+            if i % 3 == 0:
+                point.extra = [i]
+            points.append(point)
+        pairs = tuple( Pair(point, i) for i, point in enumerate(points) )
+        shared = [points[0]] * n
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('points', points)
+            store.poke('pairs', pairs)
+            store.poke('shared', shared)
+        finally:
+            store.close()
+        # check the layout
+        with h5py.File(test_file, 'r') as f:
+            group = f['points']
+            assert group.attrs['homogeneous'] == b'columns'
+            for attr in ('x', 'y', 'label'):
+                assert isinstance(group[attr], h5py.Dataset)
+            assert isinstance(group['extra'], h5py.Group)
+            assert f['pairs/first'].attrs['homogeneous'] == b'columns'
+            assert f['shared'].attrs['homogeneous'] == b'0'
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('points')
+            assert val == points
+            assert val[1].extra is None
+            assert store.peek('pairs') == pairs
+            assert store.peek('shared') == shared
+        finally:
+            store.close()
+
+
+class TestLegacySequences(object):
+
+    def test_legacy_sequences(self, tmpdir):
+        hdf5_storable(Point, replace=True)
+        # test values
+        points = []
+        for i in range(100):
+            point = Point()
+            point.x, point.y = i, float(i)
+            points.append(point)
+        data = {'labels': [ 'label{}'.format(i) for i in range(100) ],
+            'ints': { i: float(i) for i in range(100) },
+            'counts': Counter({ u'a{}'.format(i): i for i in range(100) }),
+            'points': points,
+            }
+        for legacy in (False, True):
+            test_file = os.path.join(tmpdir.strpath, 'test{:d}.h5'.format(legacy))
+            # write
+            rwa_params['hdf5.legacy_sequences'] = legacy
+            store = HDF5Store(test_file, 'w')
+            try:
+                for name in data:
+                    store.poke(name, data[name])
+            finally:
+                store.close()
+                rwa_params['hdf5.legacy_sequences'] = False
+            # check the layout
+            with h5py.File(test_file, 'r') as f:
+                versions = { name: f[name].attrs['version'] for name in data }
+                if legacy:
+                    assert versions == {'labels': b'2', 'ints': b'2', 'counts': b'1',
+                        'points': b'2'}
+                    assert f['labels'].attrs['homogeneous'] == b'0'
+                    assert f['points'].attrs['homogeneous'] == b'0'
+                    assert 'items' in f['counts']
+                else:
+                    assert versions == {'labels': b'3', 'ints': b'3', 'counts': b'2',
+                        'points': b'3'}
+                    assert isinstance(f['labels'], h5py.Dataset)
+                    assert f['points'].attrs['homogeneous'] == b'columns'
+            # read and check
+            store = HDF5Store(test_file, 'r')
+            try:
+                for name in data:
+                    assert store.peek(name) == data[name]
+            finally:
+                store.close()
+
+
+class TestLinks(object):
+
+    def test_shared_objects(self, tmpdir):
+        # test values
+        array = np.random.rand(100, 10)
+        df = DataFrame({'a': np.arange(10)})
+        pair = (array, 'a')
+        data = {'array1': array, 'array2': array, 'df1': df, 'df2': df,
+            'pair1': pair, 'pair2': pair, 'copy': array.copy(), 'text': 'a', 'text2': 'a'}
+        for link_immutables in (False, True):
+            test_file = os.path.join(tmpdir.strpath, 'test{:d}.h5'.format(link_immutables))
+            # write
+            rwa_params['poke.link_immutables'] = link_immutables
+            store = HDF5Store(test_file, 'w')
+            try:
+                store.poke('data', data)
+            finally:
+                store.close()
+                del rwa_params['poke.link_immutables']
+            # check the layout
+            with h5py.File(test_file, 'r') as f:
+                group = f['data/items']
+                assert group['array1'] == group['array2']
+                assert group['df1'] == group['df2']
+                assert group['array1'] != group['copy']
+                assert group['text'] != group['text2']
+                assert (group['pair1'] == group['pair2']) is link_immutables
+                assert group['pair1/0'] == group['array1']
+            # read and check
+            store = HDF5Store(test_file, 'r')
+            try:
+                val = store.peek('data')
+                for name in ('array1', 'array2', 'copy'):
+                    assert np.all(val[name] == array)
+                for name in ('df1', 'df2'):
+                    assert val[name].equals(df)
+                for name in ('pair1', 'pair2'):
+                    assert np.all(val[name][0] == array) and val[name][1] == 'a'
+            finally:
+                store.close()
+
+    def test_shared_references(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        array = np.random.rand(100)
+        items = [array, array]
+        data = {'a': items, 'b': items, 'c': [array], 'd': array.copy()}
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('data')
+            assert val['a'] is val['b']
+            assert val['a'][0] is val['a'][1] is val['c'][0]
+            assert val['d'] is not val['c'][0]
+            assert np.all(val['d'] == val['c'][0])
+            # distinct top calls make distinct objects
+            assert store.peek('data')['a'] is not val['a']
+        finally:
+            store.close()
+
+    def test_self_references(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        items = [1]
+        items.append(items)
+        table = {'a': 1}
+        table['self'] = {'parent': table}
+        store = HDF5Store(test_file, 'w')
+        try:
+            for name, obj in (('list', items), ('dict', table)):
+                try:
+                    store.poke(name, obj)
+                except ValueError:
+                    pass
+                else:
+                    assert False
+            # siblings are not cycles
+            shared = [1]
+            store.poke('siblings', [[shared, shared]])
+            # nor are objects that failed to serialize, if the exception was caught
+            class Tolerant(object):
+                def __init__(self, items):
+                    self.items = items
+            def poke_tolerant(store, name, obj, container, visited=None, _stack=None):
+                sub_container = store.newContainer(name, obj, container)
+                try:
+                    store.poke('items', obj.items, sub_container, visited=visited,
+                        _stack=_stack)
+                except AutoSerialFailure:
+                    pass
+            hdf5_storable(Storable(Tolerant, handlers=StorableHandler(poke=poke_tolerant)))
+            bad = [1, (i for i in ())]
+            store.poke('caught', [Tolerant(bad), bad])
+        finally:
+            store.close()
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('siblings')
+            assert val[0][0] is val[0][1] == [1]
+        finally:
+            store.close()
+
+
+class TestContentPool(object):
+
+    def test_file_pool(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        array = np.random.rand(100, 10)
+        data = {'a': array, 'b': array.copy(), 'c': array.T, 'small': np.arange(3),
+            'small2': np.arange(3), 'raw': b'x' * 1000, 'raw2': b'x' * 1000}
+        # write
+        rwa_params['hdf5.dedup'] = 100
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+            del rwa_params['hdf5.dedup']
+        # append, with the contents pooled in the first session
+        rwa_params['hdf5.dedup'] = 100
+        store = HDF5Store(test_file, 'a')
+        try:
+            store.poke('more', array.copy())
+        finally:
+            store.close()
+            del rwa_params['hdf5.dedup']
+        # check the layout; the root group contains the records only
+        with h5py.File(test_file, 'r') as f:
+            assert sorted(f) == ['data', 'more']
+            group = f['data/items']
+            assert group['a'] == group['b'] == f['more']
+            assert group['a'] != group['c']
+            assert group['small'] != group['small2']
+            assert group['raw'] == group['raw2']
+            pooled = set()
+            f.visititems(lambda name, obj: pooled.add(obj.attrs.get('pooled', None)))
+            assert len(pooled - {None}) == 3
+        # read and check, iterating over the root group
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = { name: store.peek(name) for name in store.store }
+            assert np.all(val['more'] == array)
+            val = val['data']
+            assert val['a'] is not val['b']
+            for name in data:
+                assert np.all(val[name] == data[name])
+            assert val['raw'] == data['raw']
+        finally:
+            store.close()
+
+    def test_shared_pool(self, tmpdir):
+        pool_file = os.path.join(tmpdir.strpath, 'pool.h5')
+        # test values
+        coords = np.random.rand(1000, 2)
+        snapshots = [ {'coords': coords.copy(), 'values': np.random.rand(1000)} for _ in range(3) ]
+        # write
+        rwa_params['hdf5.dedup'] = 1000
+        rwa_params['hdf5.dedup_pool'] = pool_file
+        try:
+            for i, snapshot in enumerate(snapshots):
+                store = HDF5Store(os.path.join(tmpdir.strpath, 'test{}.h5'.format(i)), 'w')
+                try:
+                    store.poke('snapshot', snapshot)
+                finally:
+                    store.close()
+        finally:
+            del rwa_params['hdf5.dedup']
+            del rwa_params['hdf5.dedup_pool']
+        # check the layout
+        with h5py.File(pool_file, 'r') as f:
+            assert len(f) == 4
+        with h5py.File(os.path.join(tmpdir.strpath, 'test0.h5'), 'r') as f:
+            link = f['snapshot/items'].get('coords', getlink=True)
+            assert isinstance(link, h5py.ExternalLink)
+        # read and check
+        for i, snapshot in enumerate(snapshots):
+            store = HDF5Store(os.path.join(tmpdir.strpath, 'test{}.h5'.format(i)), 'r')
+            try:
+                val = store.peek('snapshot')
+                assert np.all(val['coords'] == coords)
+                assert np.all(val['values'] == snapshot['values'])
+            finally:
+                store.close()
+
+
+class TestCallStack(object):
+
+    def test_error_path(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values; the generator cannot be serialized
+        data = dict(x=1, y=[1, dict(z=2, gen=(i for i in ()))])
+        for call_stack in (True, False):
+            rwa_params['call_stack'] = call_stack
+            store = HDF5Store(test_file, 'w')
+            try:
+                store.poke('data', data)
+            except AutoSerialFailure as e:
+                message = str(e)
+            else:
+                message = None
+            finally:
+                store.close()
+                del rwa_params['call_stack']
+            assert message is not None
+            # sibling records are popped from the stack
+            path = 'In: data\n    |- y\n       |- 1\n          |- gen\n'
+            assert message.startswith('\n' + path) is call_stack
+
+    def test_lazy_path(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        data = dict(a=dict(x=1), b=[1, 2])
+        # write
+        store = HDF5Store(test_file, 'w')
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+        # read and check; lazy values keep the path of their record
+        store = HDF5Store(test_file, 'r')
+        try:
+            val = store.peek('data', lazy=True).shallow()
+            for name in data:
+                assert islazy(val[name])
+                assert list(val[name]._stack) == ['data', name]
+                assert val[name].deep() == data[name]
+        finally:
+            store.close()
+
+
+class TestStats(object):
+
+    def test_stats(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values
+        array = np.arange(100.)
+        point = Point()
+        point.x, point.y = 1, 2
+        data = dict(a=array, b=[point, 'a', None], c=dict(d=array, e=1))
+        # write
+        store = HDF5Store(test_file, 'w', stats=True)
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+        poke_stats = store.stats.asdict()['poke']
+        # each record is counted once, and hard links are not counted again
+        objects = []
+        with h5py.File(test_file, 'r') as f:
+            f.visit(objects.append)
+        assert sum( c['groups'] + c['datasets'] for c in poke_stats.values() ) \
+            == len(objects)
+        assert poke_stats[format_type(np.ndarray)]['calls'] == 1
+        assert poke_stats[format_type(np.ndarray)]['bytes'] == array.nbytes
+        assert poke_stats[format_type(Point)]['calls'] == 1
+        assert poke_stats[format_type(dict)]['time'] >= \
+            poke_stats[format_type(dict)]['self time']
+        # read
+        store = HDF5Store(test_file, 'r', stats=True)
+        try:
+            store.peek('data')
+        finally:
+            store.close()
+        peek_stats = store.stats.asdict()['peek']
+        assert set(peek_stats) == set(poke_stats)
+        assert peek_stats[format_type(np.ndarray)]['bytes'] == array.nbytes
+        assert format_type(Point) in str(store.stats)
+        # profiling is disabled by default
+        store = HDF5Store(test_file, 'r')
+        try:
+            store.peek('data')
+        finally:
+            store.close()
+        assert store.stats is None
+
+    def test_trace(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        trace_file = os.path.join(tmpdir.strpath, 'trace.json')
+        stacks_file = os.path.join(tmpdir.strpath, 'stacks.txt')
+        # test values
+        data = dict(a=np.arange(100.), b=dict(c=[1, 'a']))
+        # write
+        store = HDF5Store(test_file, 'w', trace=True)
+        try:
+            store.poke('data', data)
+        finally:
+            store.close()
+        stats = store.stats
+        # events
+        events = { path: (key, start, duration, nbytes)
+            for _, path, key, start, duration, nbytes in stats.events }
+        assert events['data/a'][0] == format_type(np.ndarray)
+        assert events['data/a'][3] == data['a'].nbytes
+        assert 'data/b/c/1' in events
+        # nested events are within their parent events
+        for path, (_, start, duration, _) in events.items():
+            if '/' in path:
+                _, parent_start, parent_duration, _ = events[path.rsplit('/', 1)[0]]
+                assert parent_start <= start
+                assert start + duration <= parent_start + parent_duration
+        # self times add up to the time of the top record
+        assert abs(sum(stats.stacks.values()) - events['data'][2]) < 1e-6
+        # export
+        stats.writeChromeTrace(trace_file)
+        with open(trace_file) as f:
+            trace = json.load(f)
+        assert sorted( e['args']['path'] for e in trace['traceEvents'] ) == sorted(events)
+        stats.writeCollapsedStacks(stacks_file)
+        with open(stacks_file) as f:
+            lines = f.read().splitlines()
+        assert 'poke;Python.dict;Python.dict;Python.list;Python.unicode' in \
+            [ line.rsplit(' ', 1)[0] for line in lines ]
+
+
+class TestLazyRegistration(object):
+
+    def run(self, script):
+        return subprocess.check_output([sys.executable, '-c', script]).decode('utf-8').split()
+
+    def test_lazy_registration(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # no optional dependencies are loaded on import
+        assert self.run('import sys, rwa; '
+            'print(" ".join(m for m in ("pandas", "scipy", "tables") if m in sys.modules))') \
+            == []
+        # poke: the storable instances are registered on the object's module
+        assert self.run('from rwa import HDF5Store; from pandas import DataFrame; '
+            'from scipy import sparse; store = HDF5Store({!r}, "w"); '
+            'store.poke("frame", DataFrame(dict(a=[1, 2]))); '
+            'store.poke("matrix", sparse.eye(3, format="csr")); '
+            'store.close()'.format(test_file)) == []
+        # peek: the storable instances are registered on the storable type
+        assert self.run('from rwa import HDF5Store; store = HDF5Store({!r}, "r"); '
+            'print(type(store.peek("frame")).__name__, type(store.peek("matrix")).__name__); '
+            'store.close()'.format(test_file)) == ['DataFrame', 'csr_matrix']
+        # backward-compatible module attributes, loaded on access
+        assert self.run('from rwa.hdf5 import hdf5_storables, hdf5_aliases, sparse_storables; '
+            'print(" ".join(sorted(set( s.python_type.__name__ for s in hdf5_storables '
+            'if s.python_type.__name__ in ("DataFrame", "csr_matrix", "list") ))), '
+            'len(hdf5_aliases), bool(sparse_storables))') \
+            == ['DataFrame', 'csr_matrix', 'list', '1', 'True']
+        # options set before the lazy import are kept
+        assert self.run('from rwa import HDF5Store, rwa_params; '
+            'rwa_params["pandas.columns.force_unicode"] = False; '
+            'store = HDF5Store({!r}, "r"); store.peek("frame"); store.close(); '
+            'print(rwa_params["pandas.columns.force_unicode"], '
+            'rwa_params["pandas.index.force_unicode"])'.format(test_file)) \
+            == ['False', 'True']
+
+
+class TestDataFrameBlocks(object):
+
+    def test_dataframe_blocks(self, tmpdir):
+        test_file = os.path.join(tmpdir.strpath, 'test.h5')
+        # test values, with interleaved dtypes and duplicate index labels
+        n = 20
+        df = DataFrame(np.random.rand(n, 5), columns=[ 'f{}'.format(j) for j in range(5) ],
+            index=[0, 0] + list(range(n - 2)))
+        df.insert(0, 'i', np.arange(n))
+        df.insert(3, 'f32', np.ones(n, dtype=np.float32))
+        df['o'] = np.array([1, 'x'] * (n // 2), dtype=object)
+        df['j'] = np.arange(n, 2 * n)
+        data = {'df': df,
+            'empty': DataFrame(index=[1, 2]),
+            'dup': DataFrame(np.ones((3, 2)), columns=['a', 'a']),
+            'objects': DataFrame({'mixed': np.array(['a', 1, None], dtype=object),
+                'ints': np.array([1, 2, 3], dtype=object)}),
+            }
+        # write, with the block-wise layout and with the per-column layout
+        store = HDF5Store(test_file, 'w')
+        try:
+            for name in data:
+                store.poke(name, data[name])
+            rwa_params['pandas.blocks'] = False
+            try:
+                store.poke('columns', df.drop(columns='o'))
+            finally:
+                rwa_params['pandas.blocks'] = True
+        finally:
+            store.close()
+        # check the layout: one dataset per dtype; object columns are stored separately
+        with h5py.File(test_file, 'r') as f:
+            assert f['df'].attrs['version'] == b'3'
+            shapes = sorted( block.shape for block in f['df/blocks'].values() )
+            assert shapes == [(1, n), (2, n), (5, n)]
+            assert f['columns'].attrs['version'] == b'2'
+        # read and check
+        store = HDF5Store(test_file, 'r')
+        try:
+            for name in data:
+                obj = store.peek(name)
+                assert obj.equals(data[name])
+                assert list(obj.columns) == list(data[name].columns)
+                assert list(obj.dtypes) == list(data[name].dtypes)
+            assert store.peek('columns').equals(df.drop(columns='o'))
+        finally:
+            store.close()